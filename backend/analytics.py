@@ -0,0 +1,135 @@
+"""Spending trends over a user's history, computed with pandas.
+
+Everything is derived from two compact inputs: the monthly rollups (one row
+per month and category) and a per-day, per-category aggregate of the window.
+Each statistic is one vectorized operation over a months x categories frame,
+so five years of history takes a few tens of milliseconds.
+"""
+from datetime import date
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROLLING_WINDOWS = (3, 6, 12)
+# Extra months fetched before the window so rolling averages are complete
+# from its first month.
+LOOKBACK_MONTHS = max(ROLLING_WINDOWS) - 1
+# Full months before the current one whose daily spend rate drives the projection.
+PROJECTION_BASELINE_MONTHS = 3
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def month_range(to_month: str, months: int) -> Tuple[str, str]:
+    """Return the window's first month and the first month to fetch rollups for."""
+    last = pd.Period(to_month, freq="M")
+    first = last - (months - 1)
+    return str(first), str(first - max(LOOKBACK_MONTHS, PROJECTION_BASELINE_MONTHS))
+
+
+def _columns(frame: pd.DataFrame) -> dict:
+    """Each column as a JSON-ready list, converted in one pass over the frame."""
+    data = np.round(frame.to_numpy(dtype="float64"), 2)
+    values = data.astype(object)
+    # JSON has no NaN or infinity; both mean "not defined" here.
+    values[~np.isfinite(data)] = None
+    return {column: values[:, i].tolist() for i, column in enumerate(frame.columns)}
+
+
+def monthly_frame(rollups: List[dict], first_month: str, last_month: str) -> pd.DataFrame:
+    """Months x categories totals, with a row for every month in the range."""
+    index = pd.period_range(first_month, last_month, freq="M")
+    if not rollups:
+        return pd.DataFrame(index=index, dtype="float64")
+    frame = pd.DataFrame(rollups).pivot_table(index="month", columns="category", values="total", aggfunc="sum")
+    frame.index = pd.PeriodIndex(frame.index, freq="M")
+    return frame.reindex(index).fillna(0.0)
+
+
+def series_trends(frame: pd.DataFrame, window: pd.PeriodIndex) -> dict:
+    """Totals, month-over-month change and rolling averages for each column of ``frame``."""
+    stats = {
+        "values": frame,
+        "delta": frame.diff(),
+        "delta_pct": frame.pct_change(fill_method=None) * 100,
+    }
+    for size in ROLLING_WINDOWS:
+        stats[f"rolling_{size}"] = frame.rolling(size, min_periods=size).mean()
+    stats = {name: _columns(values.loc[window]) for name, values in stats.items()}
+    return {
+        column: {name: values[column] for name, values in stats.items()}
+        for column in frame.columns
+    }
+
+
+def weekday_heatmap(daily: List[dict], window: pd.PeriodIndex) -> dict:
+    """Spend by day of week and category, plus the average per calendar day."""
+    days = pd.date_range(window[0].start_time, window[-1].end_time.normalize(), freq="D")
+    occurrences = np.bincount(days.dayofweek, minlength=7)
+    if daily:
+        frame = pd.DataFrame(daily)
+        frame["weekday"] = pd.to_datetime(frame["day"], format="%Y-%m-%d").dt.dayofweek
+        table = frame.pivot_table(index="weekday", columns="category", values="total", aggfunc="sum")
+        table = table.reindex(range(7)).fillna(0.0)
+    else:
+        table = pd.DataFrame(index=range(7), dtype="float64")
+    totals = table.sum(axis=1)
+    summary = _columns(pd.DataFrame({"total": totals, "average": totals / occurrences}))
+    return {
+        "days": WEEKDAYS,
+        "total": summary["total"],
+        "average": summary["average"],
+        "by_category": _columns(table),
+    }
+
+
+def month_end_projection(frame: pd.DataFrame, today: date) -> Optional[dict]:
+    """Project the current month's spend from its total so far.
+
+    The remaining days are filled in at each category's average daily spend
+    over the previous PROJECTION_BASELINE_MONTHS full months.
+    """
+    month = pd.Period(today, freq="M")
+    if month not in frame.index:
+        return None
+    baseline_months = pd.period_range(month - PROJECTION_BASELINE_MONTHS, month - 1, freq="M")
+    baseline_days = sum(period.days_in_month for period in baseline_months)
+    daily_rate = frame.reindex(baseline_months).fillna(0.0).sum() / baseline_days
+
+    remaining_days = month.days_in_month - today.day
+    spent = frame.loc[month]
+    projected = spent + daily_rate * remaining_days
+    return {
+        "month": str(month),
+        "days_elapsed": today.day,
+        "days_in_month": month.days_in_month,
+        "spent_to_date": round(float(spent.sum()), 2),
+        "projected_total": round(float(projected.sum()), 2),
+        "by_category": {
+            category: {"spent_to_date": round(float(spent[category]), 2), "projected": round(float(projected[category]), 2)}
+            for category in frame.columns
+        },
+    }
+
+
+def spending_trends(rollups: List[dict], daily: List[dict], first_month: str, last_month: str, today: date) -> dict:
+    """Build the /api/stats/trends payload.
+
+    ``rollups`` must start at the fetch month from :func:`month_range` and
+    ``daily`` cover the window. Series are aligned with ``months``; values
+    that are not defined, such as a rolling average without enough history or
+    a percentage change from zero, are null.
+    """
+    window = pd.period_range(first_month, last_month, freq="M")
+    frame = monthly_frame(rollups, month_range(last_month, len(window))[1], last_month)
+    totals = frame.sum(axis=1).to_frame("total")
+
+    return {
+        "from": first_month,
+        "to": last_month,
+        "months": [str(month) for month in window],
+        "total": series_trends(totals, window)["total"],
+        "by_category": series_trends(frame, window),
+        "weekday": weekday_heatmap(daily, window),
+        "projection": month_end_projection(frame, today) if str(pd.Period(today, freq="M")) == last_month else None,
+    }
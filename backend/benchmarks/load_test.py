@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""Latency and throughput benchmark for the API.
+
+Seeds a benchmark database with users, categories, budgets, monthly rollups
+and a skewed number of expenses per user, then drives a weighted mix of the
+API's endpoints from concurrent virtual users. Requests go straight into the
+ASGI app in this process, which lets the harness count the MongoDB
+operations each one issues. Run from the backend directory:
+
+    # In-memory stand-in, nothing to install or start
+    python benchmarks/load_test.py --output results.json
+
+    # A real MongoDB, e.g. 10k users with up to 50k expenses each
+    python benchmarks/load_test.py --mongo mongodb://localhost:27017 \\
+        --users 10000 --max-expenses 50000 --output results.json
+
+    # Reuse the seeded data and compare with an earlier run
+    python benchmarks/load_test.py --mongo mongodb://localhost:27017 --skip-seed \\
+        --compare results.json --output results-new.json
+
+mongomock scans every document for each query, so absolute numbers from it
+mostly reflect the app's own overhead; use a real MongoDB to judge queries
+and indexes. The same ``--seed`` always produces the same data and request mix.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+SEED_BATCH_SIZE = 5000
+# Expense ids kept per user for the update scenario.
+SAMPLE_EXPENSES = 20
+
+TITLES = {
+    "Food": ["Groceries", "Lunch", "Coffee", "Dinner out", "Bakery"],
+    "Transport": ["Fuel", "Metro card", "Taxi", "Parking", "Train ticket"],
+    "Bills": ["Electricity", "Internet", "Phone", "Water", "Rent"],
+    "Shopping": ["Clothes", "Shoes", "Electronics", "Books", "Gifts"],
+    "Entertainment": ["Cinema", "Concert", "Streaming", "Games", "Museum"],
+    "Healthcare": ["Pharmacy", "Dentist", "Doctor visit", "Gym", "Glasses"],
+    "Other": ["Haircut", "Donation", "Laundry", "Postage", "Misc"],
+}
+# Median amount per category; amounts are log-normal around it.
+MEDIAN_AMOUNT = {
+    "Food": 15, "Transport": 12, "Bills": 80, "Shopping": 40,
+    "Entertainment": 25, "Healthcare": 35, "Other": 20,
+}
+
+_ops = contextvars.ContextVar("mongo_ops", default=None)
+
+# Collection methods that each cost at least one round trip.
+COUNTED_METHODS = {
+    "aggregate", "bulk_write", "count_documents", "delete_many", "delete_one",
+    "distinct", "estimated_document_count", "find", "find_one",
+    "find_one_and_delete", "find_one_and_replace", "find_one_and_update",
+    "insert_many", "insert_one", "replace_one", "update_many", "update_one",
+}
+
+
+def _count_op() -> None:
+    counter = _ops.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class _CountingCollection:
+    """Wraps a Motor collection and counts operations against the current request.
+
+    A ``find`` counts once however many batches its cursor fetches.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in COUNTED_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            _count_op()
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name])
+
+    def __getattr__(self, name):
+        if name == "command":
+            def command(*args, **kwargs):
+                _count_op()
+                return self._db.command(*args, **kwargs)
+            return command
+        return _CountingCollection(getattr(self._db, name))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))] * 1000, 2)
+
+
+def month_key(now: datetime, months_back: int) -> str:
+    year, month = divmod(now.year * 12 + now.month - 1 - months_back, 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+def expense_count(rng: random.Random, max_expenses: int) -> int:
+    # A few empty accounts, most with a modest history and a long tail of
+    # heavy users; the median is max_expenses / 20.
+    if rng.random() < 0.05:
+        return 0
+    return min(max_expenses, int(rng.lognormvariate(math.log(max(1, max_expenses / 20)), 1.2)))
+
+
+def make_expense(rng: random.Random, user_id: str, now: datetime, months: int) -> dict:
+    from search import search_terms
+
+    category = rng.choice(list(TITLES))
+    date = now - timedelta(seconds=rng.uniform(0, months * 30.4 * 86400))
+    title = rng.choice(TITLES[category])
+    notes = rng.choice(["", "", "split with friends", "work trip", "monthly"]) or None
+    return {
+        "expense_id": f"exp_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}",
+        "user_id": user_id,
+        "title": title,
+        "amount": round(rng.lognormvariate(math.log(MEDIAN_AMOUNT[category]), 0.6), 2),
+        "category": category,
+        "date": date.replace(hour=0, minute=0, second=0, microsecond=0),
+        "notes": notes,
+        "search_terms": search_terms(title, notes),
+        "created_at": date,
+    }
+
+
+async def seed(server, db, args) -> None:
+    from rollups import rollup_delta_ops
+
+    if await db.users.find_one({"user_id": {"$not": {"$regex": "^bench_user_"}}}):
+        raise SystemExit(f"{args.db_name} holds non-benchmark users; refusing to wipe it")
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for name in ("users", "user_sessions", "expenses", "categories", "budgets",
+                 "monthly_rollups", "data_versions"):
+        await db[name].delete_many({})
+
+    total = 0
+    started = time.perf_counter()
+    pending = []
+
+    async def flush():
+        if pending:
+            await db.expenses.insert_many(pending, ordered=False)
+            await db.monthly_rollups.bulk_write(rollup_delta_ops([], pending), ordered=False)
+            pending.clear()
+
+    for i in range(args.users):
+        user_id = f"bench_user_{i:05d}"
+        await db.users.insert_one({
+            "user_id": user_id,
+            "email": f"{user_id}@example.com",
+            "name": f"Bench User {i}",
+            "picture": None,
+            "created_at": now,
+            # Rollups are seeded alongside the expenses below.
+            "rollups_ready": True,
+        })
+        await db.user_sessions.insert_one({
+            "user_id": user_id,
+            "session_token": f"bench_token_{i:05d}",
+            "expires_at": now + timedelta(days=30),
+            "created_at": now,
+        })
+        await server.provision_predefined_categories(user_id, now)
+        await db.budgets.insert_many([
+            {
+                "budget_id": f"budget_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}",
+                "user_id": user_id,
+                "category": category,
+                "amount": float(MEDIAN_AMOUNT[category] * rng.randint(10, 40)),
+                "month": month_key(now, months_back),
+                "created_at": now,
+            }
+            for months_back in (0, 1)
+            for category in rng.sample(list(TITLES), 3)
+        ])
+
+        for _ in range(expense_count(rng, args.max_expenses)):
+            pending.append(make_expense(rng, user_id, now, args.months))
+            total += 1
+            if len(pending) >= SEED_BATCH_SIZE:
+                await flush()
+    await flush()
+    print(f"seeded {args.users} users, {total} expenses in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+async def load_fixtures(db) -> list:
+    fixtures = []
+    async for session in db.user_sessions.find({"session_token": {"$regex": "^bench_token_"}}):
+        sample = await db.expenses.find(
+            {"user_id": session["user_id"]}, {"_id": 0, "expense_id": 1}
+        ).limit(SAMPLE_EXPENSES).to_list(SAMPLE_EXPENSES)
+        fixtures.append({
+            "user_id": session["user_id"],
+            "headers": {"Authorization": f"Bearer {session['session_token']}"},
+            "expense_ids": [doc["expense_id"] for doc in sample],
+            "created": [],
+        })
+    return fixtures
+
+
+class VirtualUserRequests:
+    """The scenarios, each issuing one request as a randomly chosen user."""
+
+    def __init__(self, http: httpx.AsyncClient, rng: random.Random, months: int):
+        self.http = http
+        self.rng = rng
+        self.months = months
+        self.now = datetime.now(timezone.utc)
+
+    def month(self) -> str:
+        # Most traffic looks at the current month.
+        if self.rng.random() < 0.6:
+            return month_key(self.now, 0)
+        return month_key(self.now, self.rng.randrange(self.months))
+
+    async def auth_me(self, user):
+        return await self.http.get("/api/auth/me", headers=user["headers"])
+
+    async def dashboard(self, user):
+        return await self.http.get("/api/dashboard", params={"month": self.month()}, headers=user["headers"])
+
+    async def expenses_month(self, user):
+        return await self.http.get("/api/expenses", params={"month": self.month()}, headers=user["headers"])
+
+    async def expenses_page(self, user):
+        return await self.http.get("/api/expenses", params={"paginate": "true", "limit": 50}, headers=user["headers"])
+
+    async def categories(self, user):
+        return await self.http.get("/api/categories", headers=user["headers"])
+
+    async def budgets(self, user):
+        return await self.http.get("/api/budgets", params={"month": self.month()}, headers=user["headers"])
+
+    async def budget_status(self, user):
+        return await self.http.get("/api/budgets/status", params={"month": self.month()}, headers=user["headers"])
+
+    async def stats_month(self, user):
+        return await self.http.get("/api/stats/monthly", params={"month": self.month()}, headers=user["headers"])
+
+    async def stats_daily(self, user):
+        return await self.http.get(
+            "/api/stats/monthly", params={"month": self.month(), "daily": "true"}, headers=user["headers"]
+        )
+
+    async def stats_range(self, user):
+        params = {"from": month_key(self.now, 11), "to": month_key(self.now, 0)}
+        return await self.http.get("/api/stats/monthly", params=params, headers=user["headers"])
+
+    async def export_csv(self, user):
+        return await self.http.get("/api/export", params={"format": "csv"}, headers=user["headers"])
+
+    async def export_ndjson(self, user):
+        return await self.http.get(
+            "/api/export", params={"format": "ndjson", "month": self.month()}, headers=user["headers"]
+        )
+
+    async def search(self, user):
+        # Alternate whole words (text index) with partial ones (prefix fallback).
+        title = self.rng.choice(TITLES[self.rng.choice(list(TITLES))]).split()[0]
+        q = title if self.rng.random() < 0.5 else title[:3]
+        return await self.http.get("/api/expenses/search", params={"q": q}, headers=user["headers"])
+
+    async def create_expense(self, user):
+        category = self.rng.choice(list(TITLES))
+        response = await self.http.post("/api/expenses", headers=user["headers"], json={
+            "title": self.rng.choice(TITLES[category]),
+            "amount": round(self.rng.lognormvariate(math.log(MEDIAN_AMOUNT[category]), 0.6), 2),
+            "category": category,
+            "date": self.now.date().isoformat(),
+        })
+        if response.status_code == 200:
+            user["created"].append(response.json()["expense_id"])
+        return response
+
+    async def update_expense(self, user):
+        expense_id = self.rng.choice(user["expense_ids"] or user["created"])
+        return await self.http.put(f"/api/expenses/{expense_id}", headers=user["headers"], json={
+            "title": "Updated",
+            "amount": round(self.rng.uniform(1, 100), 2),
+            "category": self.rng.choice(list(TITLES)),
+            "date": self.now.date().isoformat(),
+        })
+
+    async def delete_expense(self, user):
+        return await self.http.delete(f"/api/expenses/{user['created'].pop()}", headers=user["headers"])
+
+    async def upsert_budget(self, user):
+        return await self.http.post("/api/budgets", headers=user["headers"], json={
+            "category": self.rng.choice(list(TITLES)),
+            "amount": float(self.rng.randint(100, 1000)),
+            "month": month_key(self.now, 0),
+        })
+
+    async def health(self, user):
+        return await self.http.get("/api/health")
+
+
+# scenario -> relative weight in the request mix
+SCENARIOS = {
+    "dashboard": 20,
+    "expenses_month": 15,
+    "expenses_page": 8,
+    "stats_month": 10,
+    "stats_daily": 4,
+    "stats_range": 4,
+    "categories": 5,
+    "budgets": 3,
+    "budget_status": 4,
+    "search": 3,
+    "auth_me": 5,
+    "create_expense": 8,
+    "update_expense": 4,
+    "delete_expense": 3,
+    "upsert_budget": 2,
+    "export_csv": 1,
+    "export_ndjson": 1,
+    "health": 1,
+}
+# mongomock has no $lookup with a sub-pipeline or $text, which these rely on.
+MOCK_UNSUPPORTED = {"dashboard", "budget_status", "search"}
+
+
+def pick_scenario(rng: random.Random, scenarios: list, weights: list, user: dict) -> str:
+    name = rng.choices(scenarios, weights)[0]
+    if name == "delete_expense" and not user["created"]:
+        return "create_expense"
+    if name == "update_expense" and not (user["expense_ids"] or user["created"]):
+        return "create_expense"
+    return name
+
+
+async def run_load(app, fixtures: list, args, scenarios: list) -> dict:
+    samples = defaultdict(lambda: {"latencies": [], "errors": 0, "ops": 0, "bytes": 0})
+    weights = [SCENARIOS[name] for name in scenarios]
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as http:
+        async def virtual_user(vu: int, stop_at: float, record: bool):
+            rng = random.Random(f"{args.seed}:{vu}:{record}")
+            requests = VirtualUserRequests(http, rng, args.months)
+            while time.perf_counter() < stop_at:
+                user = rng.choice(fixtures)
+                name = pick_scenario(rng, scenarios, weights, user)
+                counter = [0]
+                _ops.set(counter)
+                started = time.perf_counter()
+                response = await getattr(requests, name)(user)
+                elapsed = time.perf_counter() - started
+                if record:
+                    sample = samples[name]
+                    sample["latencies"].append(elapsed)
+                    sample["errors"] += response.status_code >= 400
+                    sample["ops"] += counter[0]
+                    sample["bytes"] += len(response.content)
+
+        warmup_until = time.perf_counter() + args.warmup
+        await asyncio.gather(*(virtual_user(vu, warmup_until, False) for vu in range(args.concurrency)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(vu, started + args.duration, True) for vu in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    def summarize(latencies, errors, ops, size):
+        latencies = sorted(latencies)
+        count = len(latencies)
+        return {
+            "requests": count,
+            "errors": errors,
+            "requests_per_sec": round(count / elapsed, 1),
+            "latency_ms": {
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "mean": round(sum(latencies) / count * 1000, 2) if count else None,
+            },
+            "mongo_ops_per_request": round(ops / count, 2) if count else None,
+            "response_bytes_mean": round(size / count) if count else None,
+        }
+
+    endpoints = {
+        name: summarize(s["latencies"], s["errors"], s["ops"], s["bytes"])
+        for name, s in sorted(samples.items())
+    }
+    overall = summarize(
+        [latency for s in samples.values() for latency in s["latencies"]],
+        sum(s["errors"] for s in samples.values()),
+        sum(s["ops"] for s in samples.values()),
+        sum(s["bytes"] for s in samples.values()),
+    )
+    return {"elapsed": round(elapsed, 2), "overall": overall, "endpoints": endpoints}
+
+
+def print_report(results: dict, baseline: dict = None) -> None:
+    def delta(new, old):
+        if new is None or not old:
+            return ""
+        return f"{(new - old) / old * 100:+.0f}%"
+
+    header = f"{'endpoint':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ops/req':>8} {'errors':>7}"
+    if baseline:
+        header += f" {'Δp50':>6} {'Δp95':>6} {'Δreq/s':>7}"
+    print(header)
+    rows = list(results["endpoints"].items()) + [("overall", results["overall"])]
+    for name, row in rows:
+        latency = row["latency_ms"]
+        line = (f"{name:<16} {row['requests_per_sec']:>8} {latency['p50']!s:>8} {latency['p95']!s:>8} "
+                f"{latency['p99']!s:>8} {row['mongo_ops_per_request']!s:>8} {row['errors']:>7}")
+        if baseline:
+            old = baseline["overall"] if name == "overall" else baseline["endpoints"].get(name)
+            if old:
+                line += (f" {delta(latency['p50'], old['latency_ms']['p50']):>6}"
+                         f" {delta(latency['p95'], old['latency_ms']['p95']):>6}"
+                         f" {delta(row['requests_per_sec'], old['requests_per_sec']):>7}")
+        print(line)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args) -> dict:
+    if args.mongo == "mock":
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ.setdefault("DB_NAME", args.db_name)
+    else:
+        os.environ["MONGO_URL"] = args.mongo
+        os.environ["DB_NAME"] = args.db_name
+
+    import server
+    from indexes import ensure_indexes
+
+    # The server configures INFO logging, which would log every request.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.mongo == "mock":
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.client = AsyncMongoMockClient()
+        # mongomock lacks $type in aggregations, and seeded dates are native.
+        server.DATE_STRING_FALLBACK = False
+    raw_db = server.db = server.client[args.db_name]
+
+    if not args.skip_seed:
+        await seed(server, raw_db, args)
+    await ensure_indexes(raw_db)
+    fixtures = await load_fixtures(raw_db)
+    if not fixtures:
+        raise SystemExit("no benchmark users found; run without --skip-seed first")
+
+    server.db = CountingDatabase(raw_db)
+    scenarios = args.endpoints.split(",") if args.endpoints else list(SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    if args.mongo == "mock":
+        skipped = MOCK_UNSUPPORTED.intersection(scenarios)
+        if skipped:
+            print(f"skipping {', '.join(sorted(skipped))}: not supported by mongomock", flush=True)
+        scenarios = [name for name in scenarios if name not in MOCK_UNSUPPORTED]
+
+    results = await run_load(server.app, fixtures, args, scenarios)
+    await server.cache.close()
+    server.client.close()
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "backend": "mongomock" if args.mongo == "mock" else "mongodb",
+            "users": len(fixtures),
+            "max_expenses": args.max_expenses,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        **results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mongo", default="mock", help="'mock' for mongomock-motor, or a MongoDB URL")
+    parser.add_argument("--db-name", default="expense_tracker_bench",
+                        help="database to seed and query; its collections are emptied when seeding")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--max-expenses", type=int, default=2000, help="upper bound of expenses per user")
+    parser.add_argument("--months", type=int, default=18, help="months of history to spread expenses over")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in --db-name")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--endpoints", help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON to show deltas against")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(report, baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Measure how throughput scales with the number of gunicorn workers.
+
+For each worker count this starts the production server
+(``gunicorn server:app -c gunicorn.conf.py``) against the database in
+``.env``, drives one endpoint at a fixed concurrency for a fixed time and
+reports requests/sec and latency percentiles. Run from the backend directory:
+
+    python benchmarks/worker_scaling.py --workers 1,2,4 --duration 15
+    python benchmarks/worker_scaling.py --path /api/dashboard --token <session token>
+
+The load generator runs on the same machine and takes some of its CPU, so
+compare counts against each other rather than reading the numbers as absolute.
+"""
+import argparse
+import asyncio
+import json
+import os
+import runpy
+import signal
+import subprocess
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# gunicorn.conf.py is not importable as a module name.
+available_cpus = runpy.run_path(str(BACKEND_DIR / "gunicorn.conf.py"))["available_cpus"]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))] * 1000, 2)
+
+
+async def wait_until_ready(url: str, headers: dict, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.monotonic() < deadline:
+            try:
+                await http.get(url, headers=headers)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server did not come up at {url} within {timeout}s")
+
+
+async def drive(url: str, headers: dict, concurrency: int, duration: float, warmup: float) -> dict:
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as http:
+        async def worker(stop_at: float, record: bool):
+            nonlocal errors
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    response = await http.get(url, headers=headers)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if record:
+                    latencies.append(time.perf_counter() - started)
+                    errors += not ok
+
+        warmup_until = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(warmup_until, False) for _ in range(concurrency)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(started + duration, True) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+        },
+    }
+
+
+def run_one(workers: int, args) -> dict:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "PORT": str(args.port), "ACCESS_LOG": ""}
+    server = subprocess.Popen(
+        ["gunicorn", "server:app", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{args.port}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    try:
+        asyncio.run(wait_until_ready(url, headers, args.startup_timeout))
+        result = asyncio.run(drive(url, headers, args.concurrency, args.duration, args.warmup))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    return {"workers": workers, **result}
+
+
+def main() -> None:
+    default_counts = sorted({1, 2, available_cpus()})
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", default=",".join(map(str, default_counts)),
+                        help="comma-separated worker counts (default: 1, 2 and the CPU count)")
+    parser.add_argument("--path", default="/api/health", help="endpoint to request")
+    parser.add_argument("--token", help="session token for authenticated endpoints")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured per worker count")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show the server's log output")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'workers':>7} {'req/s':>9} {'scaling':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}", flush=True)
+    for workers in [int(n) for n in args.workers.split(",")]:
+        result = run_one(workers, args)
+        baseline = results[0]["requests_per_sec"] if results else result["requests_per_sec"]
+        result["scaling"] = round(result["requests_per_sec"] / baseline, 2) if baseline else None
+        results.append(result)
+        latency = result["latency_ms"]
+        print(f"{workers:>7} {result['requests_per_sec']:>9} {result['scaling']:>7}x "
+              f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {result['errors']:>7}", flush=True)
+
+    if args.output:
+        report = {
+            "path": args.path,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "cpus": available_cpus(),
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Incremental parsers for bulk expense uploads.
+
+Each parser takes an async iterator of raw body chunks and yields
+``(row_number, fields)`` pairs, where ``fields`` is either a dict of
+ExpenseCreate fields or an exception describing why the row could not be
+parsed. Rows are numbered from 1, excluding any CSV header.
+"""
+import codecs
+import csv
+import json
+from io import StringIO
+from typing import AsyncIterator, Dict, Tuple, Union
+
+CSV_COLUMNS = ("date", "title", "category", "amount", "notes")
+
+Row = Tuple[int, Union[Dict, Exception]]
+
+
+async def _decoded(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # utf-8-sig drops the BOM that spreadsheet exports like to add.
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _split_complete_records(text: str) -> Tuple[str, str]:
+    """Split CSV text after the last newline that is not inside a quoted field."""
+    parity = 0
+    position = 0
+    cut = 0
+    lines = text.split("\n")
+    for line in lines[:-1]:
+        parity ^= line.count('"') & 1
+        position += len(line) + 1
+        if not parity:
+            cut = position
+    return text[:cut], text[cut:]
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    header = None
+    row_number = 0
+    pending = ""
+
+    def rows_from(text):
+        nonlocal header, row_number
+        for record in csv.reader(StringIO(text)):
+            if not any(cell.strip() for cell in record):
+                continue
+            if header is None:
+                header = [cell.strip().lower() for cell in record]
+                continue
+            row_number += 1
+            fields = {
+                name: value.strip()
+                for name, value in zip(header, record)
+                if name in CSV_COLUMNS
+            }
+            if not fields.get("notes"):
+                fields["notes"] = None
+            yield row_number, fields
+
+    async for text in _decoded(chunks):
+        complete, pending = _split_complete_records(pending + text)
+        for row in rows_from(complete):
+            yield row
+    if pending.strip():
+        for row in rows_from(pending):
+            yield row
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    row_number = 0
+    pending = ""
+
+    def parse(line):
+        try:
+            fields = json.loads(line)
+        except ValueError as e:
+            return e
+        if not isinstance(fields, dict):
+            return ValueError("expected a JSON object")
+        return fields
+
+    async for text in _decoded(chunks):
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                row_number += 1
+                yield row_number, parse(line)
+    if pending.strip():
+        row_number += 1
+        yield row_number, parse(pending)
+
+
+async def parse_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    # The stdlib has no incremental JSON parser, so arrays are decoded in one
+    # go; CSV and NDJSON uploads are the streaming options for large files.
+    body = b"".join([chunk async for chunk in chunks])
+    try:
+        rows = json.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON body: {e}")
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of expenses")
+    for row_number, fields in enumerate(rows, start=1):
+        if not isinstance(fields, dict):
+            fields = ValueError("expected a JSON object")
+        yield row_number, fields
+
+
+PARSERS = {
+    "application/json": parse_json_array,
+    "application/x-ndjson": parse_ndjson,
+    "application/jsonl": parse_ndjson,
+    "text/csv": parse_csv,
+}
+
+EXTENSIONS = {
+    ".json": "application/json",
+    ".ndjson": "application/x-ndjson",
+    ".jsonl": "application/x-ndjson",
+    ".csv": "text/csv",
+}
@@ -0,0 +1,299 @@
+"""Caching for the API: an in-process LRU and a shared cache tier.
+
+:class:`Cache` is what the routes use. It sits on a :class:`CacheBackend`,
+either :class:`MemoryBackend` (per process) or :class:`RedisBackend` (shared
+by every worker and instance), chosen with ``CACHE_URL``.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import orjson
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - only needed for redis:// URLs
+    redis_asyncio = None
+
+
+class LRUCache:
+    """Bounded in-process LRU cache with a per-entry expiry.
+
+    Entries expire after ``ttl`` seconds, or earlier when ``set`` is given an
+    explicit ``expires_at`` (a ``time.time()`` timestamp).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (deadline, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class CacheBackend:
+    """Key/value store used by :class:`Cache`. All TTLs are in seconds."""
+
+    name = "base"
+    # Whether every worker sees the same entries. Invalidations made through
+    # an unshared backend never reach the other workers.
+    shared = False
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        """Set ``key`` only if it is absent; return whether it was set."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, maxsize: int = 10000):
+        # Every entry carries its own TTL, the LRU default is only a ceiling.
+        self._lru = LRUCache(maxsize=maxsize, ttl=7 * 24 * 3600)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._lru.get(key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._lru.set(key, value, expires_at=time.time() + ttl)
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        # No await between the check and the set, so this is atomic.
+        if self._lru.get(key) is not None:
+            return False
+        self._lru.set(key, value, expires_at=time.time() + ttl)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._lru.delete(key)
+
+
+class RedisBackend(CacheBackend):
+    """Backend for any Redis-protocol server; values are stored as JSON."""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("CACHE_URL points at Redis but the redis package is not installed")
+        self._redis = redis_asyncio.Redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(key)
+        return None if raw is None else orjson.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._redis.set(key, orjson.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        return bool(await self._redis.set(key, orjson.dumps(value), px=max(1, int(ttl * 1000)), nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class Cache:
+    """Namespaced cache with per-user invalidation and single-flight loading.
+
+    Per-user entries are keyed under a generation number. Invalidating a
+    user stores a fresh generation, which orphans all of that user's entries
+    at once; they then age out through their TTL. Generations are seeded
+    from the clock, so one that is evicted or expires never comes back
+    with an old value.
+    """
+
+    GENERATION_TTL = 7 * 24 * 3600
+    # How long a loader holds the cross-worker lock before others give up
+    # waiting and load the value themselves.
+    LOCK_TTL = 5.0
+    LOCK_POLL_INTERVAL = 0.02
+
+    def __init__(self, backend: CacheBackend, prefix: str = "et"):
+        self.backend = backend
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def shared(self) -> bool:
+        return self.backend.shared
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.backend.get(self._key(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.backend.set(self._key(key), value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.backend.delete(self._key(key))
+
+    async def _generation(self, user_id: str) -> int:
+        key = self._key("gen", user_id)
+        generation = await self.backend.get(key)
+        if generation is None:
+            await self.backend.add(key, time.time_ns(), self.GENERATION_TTL)
+            generation = await self.backend.get(key)
+        return generation
+
+    async def invalidate_user(self, user_id: str) -> None:
+        await self.backend.set(self._key("gen", user_id), time.time_ns(), self.GENERATION_TTL)
+
+    async def get_or_load(
+        self,
+        user_id: str,
+        name: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float
+    ) -> Any:
+        """Return the cached value of ``name`` for ``user_id``, loading it on a miss.
+
+        Concurrent misses for the same key share one ``loader()`` call within
+        this process, and wait on a short backend lock across processes.
+        """
+        generation = await self._generation(user_id)
+        key = self._key("u", user_id, str(generation), name)
+
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load_once(key, loader, ttl)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting; avoid "exception never retrieved" noise.
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    async def _load_once(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        lock_key = key + ":lock"
+        locked = await self.backend.add(lock_key, 1, self.LOCK_TTL)
+        if not locked:
+            # Another worker is loading; wait for its result up to the lock TTL.
+            deadline = time.monotonic() + self.LOCK_TTL
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+                value = await self.backend.get(key)
+                if value is not None:
+                    return value
+        try:
+            self.loads += 1
+            value = await loader()
+            if value is not None:
+                await self.backend.set(key, value, ttl)
+            return value
+        finally:
+            if locked:
+                await self.backend.delete(lock_key)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "shared": self.shared,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def cache_from_url(url: Optional[str], maxsize: int = 10000, prefix: str = "et") -> Cache:
+    """Build a Cache from ``CACHE_URL``: empty or ``memory://`` for in-process, else Redis."""
+    if not url or url.startswith("memory://"):
+        return Cache(MemoryBackend(maxsize=maxsize), prefix=prefix)
+    return Cache(RedisBackend(url), prefix=prefix)
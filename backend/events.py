@@ -0,0 +1,163 @@
+"""Live updates for connected clients, sent as Server-Sent Events.
+
+Mutating routes call :meth:`EventBroker.publish` with small deltas (an
+expense added, a stats bucket changed), and every ``GET /api/events`` stream
+of that user receives them, so open dashboards update without refetching.
+
+Events reach subscribers one of two ways:
+
+``memory``
+    Straight from the publisher to the streams held by the same process.
+    Enough for a single worker; with several, a stream misses events
+    published by the others.
+``changestream``
+    The publisher inserts the event into the ``events`` collection and every
+    worker delivers it from a change stream on that collection. Needs a
+    replica set, which is what ``auto`` (the default) checks for.
+
+Every stream opens with a ``ready`` event naming the mode. Only in
+``changestream`` mode is a client sure to see its own changes come back, so
+in ``memory`` mode it should keep applying them itself.
+
+A stream that falls too far behind, or a change stream that has to be
+reopened, gets a ``resync`` event: the client should reload instead of
+applying deltas it may have missed.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterator, Optional, Set, Tuple
+
+import orjson
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+MODES = ("auto", "memory", "changestream")
+READY = "ready"
+RESYNC = "resync"
+# Tells EventSource how long to wait before reconnecting, in milliseconds.
+RETRY_MS = 3000
+
+
+def format_event(event: dict) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+        event["id"].encode(), event["type"].encode(), orjson.dumps(event["data"])
+    )
+
+
+class EventBroker:
+    def __init__(self, mode: str = "auto", queue_size: int = 100, keepalive: float = 15):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.requested_mode = mode
+        self.mode = "memory"
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.db = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self, db) -> None:
+        self.db = db
+        mode = self.requested_mode
+        if mode == "auto":
+            mode = "changestream" if await self._is_replica_set() else "memory"
+        self.mode = mode
+        if mode == "changestream":
+            self._watcher = asyncio.create_task(self._watch())
+        logger.info("Delivering live events via %s", mode)
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    async def _is_replica_set(self) -> bool:
+        try:
+            hello = await self.db.command("hello")
+        except Exception as e:
+            logger.warning("Could not check for a replica set: %s", e)
+            return False
+        # Change streams also work through mongos.
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def publish(self, user_id: str, *events: Tuple[str, Optional[dict]]) -> None:
+        """Send ``(type, data)`` events to the user's streams.
+
+        Publishing never fails the request that made the change: at worst the
+        user's other tabs show it on their next reload.
+        """
+        events = [{"id": str(ObjectId()), "type": event_type, "data": data} for event_type, data in events]
+        if self.mode == "memory":
+            for event in events:
+                self._deliver(user_id, event)
+            return
+        created_at = datetime.now(timezone.utc)
+        try:
+            await self.db.events.insert_many([
+                {"_id": ObjectId(event["id"]), "user_id": user_id, "type": event["type"],
+                 "data": event["data"], "created_at": created_at}
+                for event in events
+            ])
+        except Exception as e:
+            logger.warning("Publishing %d events for %s failed: %s", len(events), user_id, e)
+
+    def _deliver(self, user_id: str, event: dict) -> None:
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The client is not keeping up. Whatever it has queued is
+                # superseded by a reload.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"id": event["id"], "type": RESYNC, "data": None})
+
+    async def _watch(self) -> None:
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.db.events.watch(pipeline) as stream:
+                    async for change in stream:
+                        doc = change["fullDocument"]
+                        self._deliver(doc["user_id"], {"id": str(doc["_id"]), "type": doc["type"], "data": doc["data"]})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Event change stream failed, reopening it: %s", e)
+            # Anything inserted while the stream was down was missed.
+            for user_id in list(self._subscribers):
+                self._deliver(user_id, {"id": str(ObjectId()), "type": RESYNC, "data": None})
+            await asyncio.sleep(1)
+
+    @contextmanager
+    def subscribe(self, user_id: str) -> Iterator[asyncio.Queue]:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[user_id].discard(queue)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def stream(self, user_id: str) -> AsyncIterator[bytes]:
+        """The body of one user's ``text/event-stream`` response."""
+        with self.subscribe(user_id) as queue:
+            yield b"retry: %d\n\n" % RETRY_MS
+            yield format_event({"id": str(ObjectId()), "type": READY, "data": {"mode": self.mode}})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    # A comment line keeps proxies from closing an idle connection.
+                    yield b": keepalive\n\n"
+                    continue
+                yield format_event(event)
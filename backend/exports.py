@@ -0,0 +1,185 @@
+"""Streaming expense exports.
+
+Each ``stream_*`` function is an async generator that consumes a Motor cursor
+in batches of ``EXPORT_BATCH_SIZE`` documents and yields encoded chunks, so
+memory stays bounded however large the export is.
+"""
+import csv
+from datetime import datetime, timezone
+from io import StringIO
+from typing import List
+
+import orjson
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - only the columnar formats need it
+    pa = None
+    pq = None
+
+ARROW_AVAILABLE = pa is not None
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FIELDS = {"_id": 0, "expense_id": 1, "date": 1, "title": 1, "category": 1, "amount": 1, "notes": 1}
+
+
+def _as_datetime(value) -> datetime:
+    # Legacy documents may still hold an ISO string.
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def _batches(cursor):
+    batch: List[dict] = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_csv(cursor):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    # Send the header straight away so the download starts before the
+    # first batch has been fetched.
+    writer.writerow(["Date", "Title", "Category", "Amount", "Notes"])
+    yield flush()
+
+    async for batch in _batches(cursor):
+        for exp in batch:
+            date = exp["date"] if isinstance(exp["date"], str) else exp["date"].date().isoformat()
+            writer.writerow([date, exp["title"], exp["category"], exp["amount"], exp.get("notes") or ""])
+        yield flush()
+
+
+async def stream_ndjson(cursor):
+    async for batch in _batches(cursor):
+        yield b"".join(
+            orjson.dumps({
+                "expense_id": exp["expense_id"],
+                "date": _as_datetime(exp["date"]),
+                "title": exp["title"],
+                "category": exp["category"],
+                "amount": float(exp["amount"]),
+                "notes": exp.get("notes")
+            }, option=orjson.OPT_APPEND_NEWLINE)
+            for exp in batch
+        )
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written since the last take().
+
+    Arrow writers record byte offsets via tell(), so the position keeps
+    counting across takes even though the data itself is released.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema():
+    return pa.schema([
+        ("expense_id", pa.string()),
+        ("date", pa.timestamp("ms")),
+        ("title", pa.string()),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("amount", pa.float64()),
+        ("notes", pa.string()),
+    ])
+
+
+def _record_batch(batch: List[dict], schema):
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array([exp["expense_id"] for exp in batch], pa.string()),
+            pa.array([_as_datetime(exp["date"]) for exp in batch], pa.timestamp("ms")),
+            pa.array([exp["title"] for exp in batch], pa.string()),
+            pa.array([exp["category"] for exp in batch], pa.string()).dictionary_encode(),
+            pa.array([exp["amount"] for exp in batch], pa.float64()),
+            pa.array([exp.get("notes") for exp in batch], pa.string()),
+        ],
+        schema=schema
+    )
+
+
+async def _stream_arrow_writer(cursor, open_writer):
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = open_writer(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        async for batch in _batches(cursor):
+            writer.write_batch(_record_batch(batch, schema))
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def stream_parquet(cursor):
+    # One row group per batch; the footer is written when the cursor is exhausted.
+    return _stream_arrow_writer(
+        cursor,
+        lambda sink, schema: pq.ParquetWriter(sink, schema, compression="zstd")
+    )
+
+
+def stream_arrow(cursor):
+    # Uncompressed IPC is larger than the same export as CSV. pyarrow and
+    # other Arrow readers decompress zstd buffers transparently.
+    return _stream_arrow_writer(
+        cursor,
+        lambda sink, schema: pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    )
+
+
+# format -> (stream function, media type, file extension, needs pyarrow)
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv", "csv", False),
+    "ndjson": (stream_ndjson, "application/x-ndjson", "ndjson", False),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet", "parquet", True),
+    "arrow": (stream_arrow, "application/vnd.apache.arrow.stream", "arrow", True),
+}
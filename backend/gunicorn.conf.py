@@ -0,0 +1,103 @@
+"""Gunicorn settings for the production server.
+
+Run from the backend directory with ``gunicorn server:app -c gunicorn.conf.py``.
+Each setting can be overridden from the environment, or on the command line.
+"""
+import glob
+import logging
+import math
+import os
+import tempfile
+
+from uvicorn.workers import UvicornWorker
+
+
+def available_cpus() -> int:
+    """CPUs this process can actually use, honouring container CPU quotas."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8001')}"
+
+# Each worker runs its own event loop, so one per core keeps every core busy;
+# the usual 2n+1 rule is meant for synchronous workers. Without a shared
+# cache (CACHE_URL) each worker caches sessions and stats on its own and
+# live events may not reach the other workers, so the default is then one.
+cache_url = os.environ.get("CACHE_URL", "")
+shared_cache = bool(cache_url) and not cache_url.startswith("memory://")
+workers = int(os.environ.get("WEB_CONCURRENCY", available_cpus() if shared_cache else 1))
+
+# Import the app once in the master so workers fork with it already loaded.
+# Startup hooks (index bootstrap, HTTP clients) still run in every worker.
+preload_app = True
+
+# On SIGTERM workers stop accepting connections and get this long to finish
+# in-flight requests and run their shutdown hooks.
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+
+# Recycling workers is off by default; set MAX_REQUESTS to bound slow leaks.
+max_requests = int(os.environ.get("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "0"))
+
+# Render terminates TLS in front of the service.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "*")
+
+# uvicorn runs the shutdown hooks only once every open response has
+# finished, and /api/events streams never finish on their own. After this
+# many seconds whatever is still open is cancelled, leaving the rest of
+# graceful_timeout for the hooks; EventSource clients simply reconnect.
+drain_timeout = int(os.environ.get("DRAIN_TIMEOUT", str(max(graceful_timeout // 3, 1))))
+
+
+class StreamingWorker(UvicornWorker):
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "timeout_graceful_shutdown": drain_timeout}
+
+
+# With uvloop and httptools installed the uvicorn worker picks them up for
+# the event loop and HTTP parser.
+worker_class = StreamingWorker
+
+accesslog = os.environ.get("ACCESS_LOG", "-") or None
+loglevel = os.environ.get("LOG_LEVEL", "info")
+
+# Workers write their Prometheus samples here so /metrics can add them up.
+# It has to exist before the app, and with it prometheus_client, is loaded.
+os.makedirs(os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "expense-tracker-metrics")
+), exist_ok=True)
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be summed in as well. This
+    # runs after the preload, but the master never records any samples.
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(path)
+
+
+def when_ready(server):
+    if server.cfg.workers > 1 and not shared_cache:
+        logging.getLogger("gunicorn.error").warning(
+            "Running %d workers with the in-process cache: logouts take up to "
+            "LOCAL_SESSION_CACHE_TTL to reach other workers, and with "
+            "EVENTS_MODE=memory live events only reach streams on the worker "
+            "that made the change. Set CACHE_URL and use a replica set.",
+            server.cfg.workers
+        )
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,144 @@
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Index definitions keyed by collection. Every query shape used by server.py
+# should be served by one of these; keep them in sync when adding routes.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        # Mongo removes a session once expires_at (a BSON date) has passed.
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "expenses": [
+        IndexModel([("expense_id", ASCENDING)], name="expense_id_unique", unique=True),
+        # Also the keyset order for paginated listing: (date, expense_id) desc.
+        IndexModel(
+            [("user_id", ASCENDING), ("date", DESCENDING), ("expense_id", DESCENDING)],
+            name="user_id_date_expense_id",
+        ),
+        # Search: whole words via $text (user_id must be matched by equality),
+        # word prefixes via the search_terms array.
+        IndexModel(
+            [("user_id", ASCENDING), ("title", TEXT), ("notes", TEXT)],
+            name="user_id_title_notes_text",
+            weights={"title": 3, "notes": 1},
+        ),
+        IndexModel([("user_id", ASCENDING), ("search_terms", ASCENDING)], name="user_id_search_terms"),
+    ],
+    "categories": [
+        IndexModel(
+            [("user_id", ASCENDING), ("category_id", ASCENDING)],
+            name="user_id_category_id_unique",
+            unique=True,
+        ),
+    ],
+    "budgets": [
+        IndexModel(
+            [("user_id", ASCENDING), ("category", ASCENDING), ("month", ASCENDING)],
+            name="user_id_category_month_unique",
+            unique=True,
+        ),
+    ],
+    "monthly_rollups": [
+        IndexModel(
+            [("user_id", ASCENDING), ("month", ASCENDING), ("category", ASCENDING)],
+            name="user_id_month_category_unique",
+            unique=True,
+        ),
+    ],
+    "jobs": [
+        IndexModel([("job_id", ASCENDING)], name="job_id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+        # Claiming: the oldest queued job, or a running one whose lease ran out.
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # Only finished jobs have expires_at. The runner purges them along
+        # with their GridFS files, so this is not a TTL index.
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "events": [
+        # Events are only read from the change stream as they are inserted;
+        # the documents just need to be cleaned up.
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=3600),
+    ],
+}
+
+class IndexBuildError(Exception):
+    """Raised by ensure_indexes after it has tried every index, naming the ones that failed."""
+
+
+# Options that change index semantics; a mismatch on any of them means the
+# existing index cannot serve as the one we expect.
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "weights")
+
+
+def _options(spec: dict) -> dict:
+    return {opt: spec.get(opt) for opt in _COMPARED_OPTIONS if spec.get(opt) not in (None, False)}
+
+
+def _key(fields, weights=None) -> tuple:
+    """An index key in comparable form, with text fields in name order.
+
+    The server reports a text index's key as ``_fts``/``_ftsx`` and lists
+    its fields under ``weights`` instead.
+    """
+    text_fields = sorted(weights or [field for field, direction in fields if direction == TEXT])
+    key = []
+    for field, direction in fields:
+        if field == "_ftsx":
+            continue
+        if direction == TEXT:
+            key.extend((name, TEXT) for name in text_fields)
+            text_fields = []
+        else:
+            key.append((field, direction))
+    return tuple(key)
+
+
+async def ensure_indexes(db) -> None:
+    """Create any missing index from INDEX_SPECS and log mismatched ones.
+
+    Safe to run on every startup: existing indexes that match are left alone,
+    and an index that exists with the same keys but different options is
+    reported instead of being dropped. Raises IndexBuildError if any missing
+    index could not be created, e.g. a unique one blocked by duplicates.
+    """
+    failures = []
+    for collection_name, models in INDEX_SPECS.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        by_key = {_key(info["key"], info.get("weights")): (name, info) for name, info in existing.items()}
+
+        missing = []
+        for model in models:
+            spec = model.document
+            key = _key(spec["key"].items(), spec.get("weights"))
+            found = by_key.get(key)
+            if found is None:
+                logger.info("Index %s.%s is missing, creating it", collection_name, spec["name"])
+                missing.append(model)
+                continue
+            existing_name, info = found
+            if _options(info) != _options(spec):
+                logger.warning(
+                    "Index %s.%s does not match the expected definition %s: found %s with %s",
+                    collection_name, spec["name"], _options(spec), existing_name, _options(info)
+                )
+
+        # One command per index so a single failure (e.g. duplicate keys
+        # blocking a unique index) does not prevent the others.
+        for model in missing:
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                failures.append(f"{collection_name}.{model.document['name']}: {e}")
+    if failures:
+        raise IndexBuildError("Failed to create indexes: " + "; ".join(failures))
@@ -0,0 +1,376 @@
+"""Background jobs for work too slow to run inside a request.
+
+Jobs are documents in the ``jobs`` collection, so every gunicorn worker sees
+the same queue and a job outlives the process that accepted it. Each worker
+runs a :class:`JobRunner` with a fixed number of slots. A slot claims the
+oldest queued job with an atomic ``find_one_and_update``, which also takes a
+lease on it, and renews the lease while the handler runs.
+
+A job whose lease runs out (its worker crashed or was killed) is claimed
+again by whichever worker gets to it first; on a graceful shutdown running
+jobs are put back in the queue straight away. Either way a handler can run
+more than once, so it must be safe to repeat. Files a job produces, such as
+exports, are stored in GridFS and removed with the job once it expires.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+RESULT_BUCKET = "job_results"
+# Fields that only the runner needs; everything else is shown to the user.
+INTERNAL_FIELDS = {"_id": 0, "worker": 0, "lease_expires_at": 0, "result_file": 0, "cancel_requested": 0}
+PURGE_INTERVAL = 3600
+
+
+class LeaseLost(Exception):
+    """Another worker took the job over, so this attempt must not record anything."""
+
+
+def _now() -> datetime:
+    # Stored naive, like every other date in the database.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobContext:
+    """What a handler gets: the job document and ways to report back."""
+
+    def __init__(self, runner: "JobRunner", job: dict):
+        self.job = job
+        self.params = job.get("params") or {}
+        # Saved with every lease renewal and when the job finishes, so
+        # handlers can update it as often as they like.
+        self.progress: dict = job.get("progress") or {}
+        self._runner = runner
+
+    async def save_result_file(
+        self, chunks: AsyncIterator[Union[bytes, str]], filename: str, content_type: str
+    ) -> dict:
+        """Store a streamed result in GridFS; it becomes the job's download."""
+        upload = self._runner.bucket.open_upload_stream(
+            filename, metadata={"job_id": self.job["job_id"], "content_type": content_type}
+        )
+        size = 0
+        try:
+            async for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                await upload.write(chunk)
+                size += len(chunk)
+                self.progress["bytes_written"] = size
+        except BaseException:
+            await upload.abort()
+            raise
+        await upload.close()
+        await self._runner.set_result_file(self.job, upload._id)
+        return {"filename": filename, "content_type": content_type, "size": size}
+
+
+Handler = Callable[[JobContext], Awaitable[Optional[dict]]]
+
+
+class JobRunner:
+    def __init__(
+        self,
+        concurrency: int = 2,
+        lease_seconds: float = 30,
+        poll_interval: float = 5,
+        max_attempts: int = 3,
+        retention: timedelta = timedelta(days=7)
+    ):
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, Handler] = {}
+        self.db = None
+        self.bucket: Optional[AsyncIOMotorGridFSBucket] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def handler(self, kind: str) -> Callable[[Handler], Handler]:
+        """Register the coroutine that runs jobs of ``kind``."""
+        def register(func: Handler) -> Handler:
+            self.handlers[kind] = func
+            return func
+        return register
+
+    async def start(self, db) -> None:
+        self.db = db
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=RESULT_BUCKET)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._slot()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._purge_expired()))
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and hand the running ones back to the queue."""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # Submitting and inspecting jobs, from request handlers.
+
+    async def submit(self, user_id: str, kind: str, params: dict) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = _now()
+        job = {
+            "job_id": f"job_{uuid.uuid4().hex[:12]}",
+            "user_id": user_id,
+            "kind": kind,
+            "params": params,
+            "status": QUEUED,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "expires_at": None,
+        }
+        await self.db.jobs.insert_one(dict(job))
+        # A free slot in this worker picks it up now; other workers only
+        # notice it on their next poll.
+        self._wakeup.set()
+        return job
+
+    async def get(self, user_id: str, job_id: str, internal: bool = False) -> Optional[dict]:
+        return await self.db.jobs.find_one(
+            {"job_id": job_id, "user_id": user_id}, None if internal else INTERNAL_FIELDS
+        )
+
+    async def list_jobs(self, user_id: str, limit: int = 50) -> List[dict]:
+        return await self.db.jobs.find(
+            {"user_id": user_id}, INTERNAL_FIELDS
+        ).sort("created_at", -1).to_list(limit)
+
+    async def count_active(self, user_id: str) -> int:
+        return await self.db.jobs.count_documents({"user_id": user_id, "status": {"$in": list(ACTIVE_STATES)}})
+
+    async def cancel(self, user_id: str, job_id: str) -> Optional[dict]:
+        """Cancel a job; returns the job, or None if the user has no such job.
+
+        A queued job is cancelled on the spot. A running one is flagged, and
+        the worker running it stops it at its next lease renewal, or right
+        away if that is this worker. Finished jobs are returned unchanged.
+        """
+        now = _now()
+        job = await self.db.jobs.find_one_and_update(
+            {"job_id": job_id, "user_id": user_id, "status": QUEUED},
+            {"$set": {"status": CANCELLED, "finished_at": now, "expires_at": now + self.retention}},
+            projection=INTERNAL_FIELDS, return_document=ReturnDocument.AFTER
+        )
+        if job is not None:
+            return job
+        job = await self.db.jobs.find_one_and_update(
+            {"job_id": job_id, "user_id": user_id, "status": RUNNING},
+            {"$set": {"cancel_requested": True}},
+            projection=INTERNAL_FIELDS, return_document=ReturnDocument.AFTER
+        )
+        if job is not None:
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+            return job
+        return await self.get(user_id, job_id)
+
+    async def open_result(self, job: dict):
+        """A GridFS download stream for the job's file, or None if it has none."""
+        if not job.get("result_file"):
+            return None
+        return await self.bucket.open_download_stream(job["result_file"])
+
+    async def set_result_file(self, job: dict, file_id) -> None:
+        previous = await self.db.jobs.find_one_and_update(
+            {"job_id": job["job_id"], "worker": self.worker_id},
+            {"$set": {"result_file": file_id}},
+            projection={"result_file": 1}
+        )
+        if previous is None:
+            await self.bucket.delete(file_id)
+            raise LeaseLost(job["job_id"])
+        if previous.get("result_file"):
+            # Left behind by an earlier attempt.
+            await self._delete_file(previous["result_file"])
+
+    # Running jobs.
+
+    async def _slot(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.warning("Claiming a job failed: %s", e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _claim(self) -> Optional[dict]:
+        now = _now()
+        job = await self.db.jobs.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED},
+                # Abandoned by a worker that died without releasing it.
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return None
+        if job.get("cancel_requested"):
+            await self._finish(job, CANCELLED)
+            return None
+        if job["attempts"] > self.max_attempts:
+            await self._finish(job, FAILED, error=f"Gave up after {self.max_attempts} attempts")
+            return None
+        if job["kind"] not in self.handlers:
+            await self._finish(job, FAILED, error=f"Unknown job kind: {job['kind']}")
+            return None
+        return job
+
+    async def _run(self, job: dict) -> None:
+        context = JobContext(self, job)
+        task = asyncio.create_task(self.handlers[job["kind"]](context))
+        self._running[job["job_id"]] = task
+        heartbeat = asyncio.create_task(self._heartbeat(job, context, task))
+        started = time.perf_counter()
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                # stop() cancelled this slot rather than the job itself.
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await self._release(job, context)
+                raise
+            if self._stopping:
+                await self._release(job, context)
+            else:
+                await self._finish(job, CANCELLED, progress=context.progress)
+        except LeaseLost:
+            logger.warning("Job %s was taken over by another worker", job["job_id"])
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["job_id"], job["kind"])
+            await self._finish(job, FAILED, progress=context.progress, error=str(e) or type(e).__name__)
+        else:
+            logger.info("Job %s (%s) finished in %.1fs", job["job_id"], job["kind"], time.perf_counter() - started)
+            await self._finish(job, SUCCEEDED, progress=context.progress, result=result)
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job["job_id"], None)
+
+    async def _heartbeat(self, job: dict, context: JobContext, task: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                current = await self.db.jobs.find_one_and_update(
+                    {"job_id": job["job_id"], "worker": self.worker_id, "status": RUNNING},
+                    {"$set": {
+                        "lease_expires_at": _now() + timedelta(seconds=self.lease_seconds),
+                        "progress": context.progress,
+                    }},
+                    projection={"cancel_requested": 1},
+                    return_document=ReturnDocument.AFTER
+                )
+            except Exception as e:
+                # Keep going; the lease only runs out if renewals keep failing.
+                logger.warning("Renewing the lease on job %s failed: %s", job["job_id"], e)
+                continue
+            if current is None or current.get("cancel_requested"):
+                # Cancelled, or the lease ran out and another worker owns it now.
+                task.cancel()
+                return
+
+    async def _release(self, job: dict, context: JobContext) -> None:
+        await self.db.jobs.update_one(
+            {"job_id": job["job_id"], "worker": self.worker_id, "status": RUNNING},
+            {
+                "$set": {"status": QUEUED, "progress": context.progress},
+                "$unset": {"worker": "", "lease_expires_at": ""},
+                # Being interrupted by a deploy is not the job's fault.
+                "$inc": {"attempts": -1},
+            }
+        )
+        logger.info("Job %s handed back to the queue", job["job_id"])
+
+    async def _finish(
+        self, job: dict, status: str, progress: Optional[dict] = None,
+        result: Optional[dict] = None, error: Optional[str] = None
+    ) -> None:
+        now = _now()
+        update = {
+            "status": status,
+            "result": result,
+            "error": error,
+            "finished_at": now,
+            "expires_at": now + self.retention,
+        }
+        if progress is not None:
+            update["progress"] = progress
+        finished = await self.db.jobs.find_one_and_update(
+            {"job_id": job["job_id"], "worker": self.worker_id, "status": RUNNING},
+            {"$set": update, "$unset": {"lease_expires_at": ""}},
+            projection={"result_file": 1}
+        )
+        if finished is not None and status != SUCCEEDED and finished.get("result_file"):
+            await self._delete_file(finished["result_file"])
+
+    async def _delete_file(self, file_id) -> None:
+        try:
+            await self.bucket.delete(file_id)
+        except Exception as e:
+            logger.warning("Deleting job result %s failed: %s", file_id, e)
+
+    async def _purge_expired(self) -> None:
+        """Remove finished jobs past their retention, and their files."""
+        while True:
+            try:
+                async for job in self.db.jobs.find(
+                    {"expires_at": {"$lt": _now()}}, {"job_id": 1, "result_file": 1}
+                ):
+                    if job.get("result_file"):
+                        await self._delete_file(job["result_file"])
+                    await self.db.jobs.delete_one({"_id": job["_id"]})
+            except Exception as e:
+                logger.warning("Purging expired jobs failed: %s", e)
+            await asyncio.sleep(PURGE_INTERVAL)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Maintenance commands for the expense tracker database.
+
+Run from the backend directory, e.g. ``python manage.py migrate-dates``.
+Commands are safe to run while the API is serving traffic, and bump the data
+version of every user whose data they rewrite so no stale response is
+revalidated as current.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import Iterable
+
+from indexes import IndexBuildError, ensure_indexes
+from migrations import backfill_search_terms, migrate_dates
+from rollups import sync_rollups
+from server import bump_data_version, client, db
+
+logger = logging.getLogger("manage")
+
+
+async def bump_users(user_ids: Iterable[str]) -> None:
+    await asyncio.gather(*(bump_data_version(user_id) for user_id in set(user_ids)))
+
+
+async def create_indexes() -> None:
+    try:
+        await ensure_indexes(db)
+    except IndexBuildError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+    logger.info("All indexes are in place")
+
+
+async def dedupe_budgets() -> None:
+    """Keep only the newest budget of each (user_id, category, month).
+
+    Older releases could save the same budget twice, and the duplicates
+    block the unique index that budget writes now rely on.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {"user_id": "$user_id", "category": "$category", "month": "$month"},
+            "keep": {"$max": "$_id"},
+            "ids": {"$push": "$_id"}
+        }},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ]
+    removed = 0
+    touched = []
+    async for group in db.budgets.aggregate(pipeline, allowDiskUse=True):
+        result = await db.budgets.delete_many({"_id": {"$in": [i for i in group["ids"] if i != group["keep"]]}})
+        removed += result.deleted_count
+        touched.append(group["_id"]["user_id"])
+    await bump_users(touched)
+    logger.info("budgets: done, %d duplicates removed", removed)
+
+
+async def check_rollups(user_id: str, repair: bool) -> None:
+    report = await sync_rollups(db, user_id=user_id, repair=repair, on_repair=bump_data_version)
+    print(json.dumps(report, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser(
+        "ensure-indexes", help="Create missing indexes, waiting for the builds to finish"
+    )
+
+    subparsers.add_parser(
+        "dedupe-budgets", help="Remove duplicate budgets, keeping the newest, so the unique index can be built"
+    )
+
+    migrate = subparsers.add_parser(
+        "migrate-dates", help="Convert ISO string dates to native BSON dates"
+    )
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.add_argument("--user", help="Only convert this user_id's documents")
+
+    backfill = subparsers.add_parser(
+        "backfill-search-terms", help="Store search terms on expenses created before search existed"
+    )
+    backfill.add_argument("--batch-size", type=int, default=1000)
+
+    for name, help_text in (
+        ("verify-rollups", "Recompute monthly rollups and report drift"),
+        ("rebuild-rollups", "Recompute monthly rollups and overwrite drifted buckets"),
+    ):
+        rollup_parser = subparsers.add_parser(name, help=help_text)
+        rollup_parser.add_argument("--user", help="Only check this user_id")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "ensure-indexes":
+            asyncio.run(create_indexes())
+        elif args.command == "dedupe-budgets":
+            asyncio.run(dedupe_budgets())
+        elif args.command == "migrate-dates":
+            asyncio.run(migrate_dates(db, args.batch_size, args.user, on_change=bump_data_version))
+        elif args.command == "backfill-search-terms":
+            asyncio.run(backfill_search_terms(db, args.batch_size, on_change=bump_data_version))
+        elif args.command in ("verify-rollups", "rebuild-rollups"):
+            asyncio.run(check_rollups(args.user, repair=args.command == "rebuild-rollups"))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
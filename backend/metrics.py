@@ -0,0 +1,160 @@
+"""Prometheus metrics for requests and the MongoDB commands they issue.
+
+:class:`MetricsMiddleware` times every HTTP request and adds a
+``Server-Timing`` header. :class:`MongoCommandListener` is registered on the
+Motor client and charges each command to the request that issued it, so
+``mongo_commands_per_request`` shows which routes make many round trips.
+
+When ``PROMETHEUS_MULTIPROC_DIR`` is set (gunicorn.conf.py sets it), workers
+write their samples there and :func:`render` aggregates all of them.
+"""
+import contextvars
+import os
+import time
+from threading import Lock
+from typing import Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 25, 50, 100)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle a request, by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled", multiprocess_mode="livesum"
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size, by route template",
+    ["method", "route"], buckets=SIZE_BUCKETS
+)
+MONGO_COMMANDS_PER_REQUEST = Histogram(
+    "mongo_commands_per_request", "MongoDB commands issued while handling one request",
+    ["method", "route"], buckets=COMMAND_COUNT_BUCKETS
+)
+MONGO_TIME_PER_REQUEST = Histogram(
+    "mongo_time_per_request_seconds", "Time spent in MongoDB commands while handling one request",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency",
+    ["command"], buckets=LATENCY_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error", ["command"]
+)
+
+
+class RequestStats:
+    """MongoDB work done on behalf of one request.
+
+    Motor runs commands on executor threads, and a request can have several
+    in flight at once (``asyncio.gather``), hence the lock.
+    """
+
+    __slots__ = ("mongo_commands", "mongo_seconds", "_lock")
+
+    def __init__(self):
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self._lock = Lock()
+
+    def add_command(self, seconds: float) -> None:
+        with self._lock:
+            self.mongo_commands += 1
+            self.mongo_seconds += seconds
+
+    def server_timing(self, elapsed: float) -> str:
+        return (
+            f"app;dur={elapsed * 1000:.1f}, "
+            f'mongo;dur={self.mongo_seconds * 1000:.1f};desc="{self.mongo_commands} commands"'
+        )
+
+
+# Motor copies the caller's context onto its executor threads, so command
+# events see the stats of the request that issued them.
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._record(event)
+
+    def failed(self, event) -> None:
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+        self._record(event)
+
+    def _record(self, event) -> None:
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_DURATION.labels(event.command_name).observe(seconds)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.add_command(seconds)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed response bodies are timed to the last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(time.perf_counter() - started))
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _current_request.reset(token)
+
+            # The route template keeps label cardinality bounded; FastAPI
+            # stores the matched route in the scope.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_DURATION.labels(method, route, str(status)).observe(elapsed)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            MONGO_COMMANDS_PER_REQUEST.labels(method, route).observe(stats.mongo_commands)
+            MONGO_TIME_PER_REQUEST.labels(method, route).observe(stats.mongo_seconds)
+
+
+def render() -> Tuple[bytes, str]:
+    """Return the metrics exposition and its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,124 @@
+"""One-off data migrations for documents written by older releases.
+
+Both the maintenance CLI (manage.py) and the background job handlers in
+server.py run these. Each walks its collection in ``_id`` order in batches
+and only rewrites a document if it still holds what was read, so they are
+safe on a live database. ``on_change(user_id)`` is awaited for every user
+whose documents a batch rewrote.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Iterable, Optional
+
+from pymongo import UpdateOne
+
+from search import search_terms
+
+logger = logging.getLogger(__name__)
+
+ChangeHook = Optional[Callable[[str], Awaitable[None]]]
+
+# Fields that older releases wrote as ISO strings and that are now stored as
+# native BSON dates.
+DATE_FIELDS = {
+    "expenses": ["date", "created_at"],
+    "user_sessions": ["expires_at", "created_at"],
+}
+
+
+def parse_iso_datetime(value: str) -> datetime:
+    """Parse an ISO date/datetime string into a naive UTC datetime, as stored in Mongo."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+async def _notify(on_change: ChangeHook, user_ids: Iterable[str]) -> None:
+    if on_change is not None:
+        await asyncio.gather(*(on_change(user_id) for user_id in set(user_ids)))
+
+
+async def migrate_dates(
+    db, batch_size: int, user_id: Optional[str] = None, on_change: ChangeHook = None
+) -> dict:
+    """Convert legacy string dates, optionally for one user only; returns counts per collection."""
+    summary = {}
+    for collection_name, fields in DATE_FIELDS.items():
+        collection = db[collection_name]
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        if user_id:
+            query["user_id"] = user_id
+        projection = {"user_id": 1, **{field: 1 for field in fields}}
+        converted = skipped = 0
+        last_id = None
+
+        # Walk the collection in _id order so each batch is an index range
+        # scan and unparseable documents are never revisited.
+        while True:
+            batch_query = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+            docs = await collection.find(batch_query, projection).sort("_id", 1).to_list(batch_size)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+
+            ops = []
+            touched = []
+            for doc in docs:
+                updates = {}
+                for field in fields:
+                    value = doc.get(field)
+                    if not isinstance(value, str):
+                        continue
+                    try:
+                        updates[field] = parse_iso_datetime(value)
+                    except ValueError:
+                        logger.warning("%s %s: unparseable %s %r", collection_name, doc["_id"], field, value)
+                if not updates:
+                    skipped += 1
+                    continue
+                # Match on the original values so a concurrent write from the
+                # API is never overwritten with stale data.
+                match = {"_id": doc["_id"], **{field: doc[field] for field in updates}}
+                ops.append(UpdateOne(match, {"$set": updates}))
+                touched.append(doc["user_id"])
+
+            if ops:
+                result = await collection.bulk_write(ops, ordered=False)
+                converted += result.modified_count
+                await _notify(on_change, touched)
+            logger.info("%s: converted %d documents so far", collection_name, converted)
+
+        logger.info("%s: done, %d converted, %d skipped", collection_name, converted, skipped)
+        summary[collection_name] = {"converted": converted, "skipped": skipped}
+    return summary
+
+
+async def backfill_search_terms(db, batch_size: int, on_change: ChangeHook = None) -> None:
+    """Give expenses written before search existed their search_terms."""
+    query = {"search_terms": {"$exists": False}}
+    updated = 0
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+        docs = await db.expenses.find(
+            batch_query, {"user_id": 1, "title": 1, "notes": 1}
+        ).sort("_id", 1).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        # Match on title and notes so a concurrent edit, which sets its own
+        # terms, is never overwritten with stale ones.
+        ops = [
+            UpdateOne(
+                {"_id": doc["_id"], "title": doc["title"], "notes": doc.get("notes")},
+                {"$set": {"search_terms": search_terms(doc["title"], doc.get("notes"))}}
+            )
+            for doc in docs
+        ]
+        result = await db.expenses.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        await _notify(on_change, [doc["user_id"] for doc in docs])
+        logger.info("expenses: %d search term lists written so far", updated)
+    logger.info("expenses: done, %d search term lists written", updated)
@@ -0,0 +1,229 @@
+"""Opt-in slow-query profiler for MongoDB reads.
+
+:class:`SlowQueryProfiler` is a pymongo command listener. Every ``find`` or
+``aggregate`` slower than the threshold is logged with its normalized shape
+(the filter or pipeline with user values replaced by ``"?"``) and counted
+against that shape. The first time a shape turns up, it is re-run through
+``explain`` to capture the winning plan and how many documents were examined
+per document returned. :meth:`SlowQueryProfiler.top` lists the worst shapes.
+
+The listener runs on Motor's executor threads; explains and bookkeeping are
+handed over to the event loop, so profiling never blocks a driver call.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson.regex import Regex
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+PROFILED_COMMANDS = {"find", "aggregate"}
+# Keys that describe the query; the rest ($db, lsid, cursor, ...) are plumbing.
+SHAPE_KEYS = ("filter", "sort", "pipeline", "hint")
+# Driver-added fields that explain rejects or that belong to the original session.
+EXPLAIN_STRIP = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "apiVersion", "apiStrict"}
+MAX_SHAPES = 500
+EXPLAIN_QUEUE_SIZE = 100
+
+
+def normalize(value: Any, key: Optional[str] = None) -> Any:
+    """Replace literal values with ``"?"``, keeping operators, field names and field paths."""
+    if key in ("$sort", "sort"):
+        return value
+    if isinstance(value, dict):
+        return {k: normalize(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(item, (dict, list, tuple)) for item in value):
+            return "?"
+        return [normalize(item) for item in value]
+    if isinstance(value, (Regex, re.Pattern)):
+        return "/?/"
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+
+def query_shape(command_name: str, command: dict) -> str:
+    collection = command.get(command_name)
+    shape = {key: normalize(command[key], key) for key in SHAPE_KEYS if key in command}
+    return json.dumps({"collection": collection, "op": command_name, **shape}, sort_keys=True, default=str)
+
+
+def _find_key(doc: Any, key: str) -> Any:
+    # Explain output nests differently by server version and command.
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_plan(plan: Optional[dict]) -> Optional[str]:
+    """Render a winning plan as ``FETCH > IXSCAN(index_name)``."""
+    if not plan:
+        return None
+    plan = plan.get("queryPlan", plan)
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        children = plan.get("inputStages") or [plan.get("inputStage")]
+        plan = children[0] if children else None
+    return " > ".join(stages)
+
+
+class SlowQueryProfiler(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float, explain: bool = True):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._pending: Dict[Tuple[Any, int], Tuple[str, dict]] = {}
+        self._lock = Lock()
+        self._shapes: Dict[str, dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._client = None
+
+    async def start(self, client) -> None:
+        """Begin profiling; ``client`` is the Motor client used to run explains."""
+        self._client = client
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self._worker = asyncio.create_task(self._explain_worker())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._loop = None
+
+    # Listener callbacks, called on driver threads.
+
+    def started(self, event) -> None:
+        if self._loop is None or event.command_name not in PROFILED_COMMANDS:
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event) -> None:
+        self._finish(event)
+
+    def failed(self, event) -> None:
+        self._finish(event)
+
+    def _finish(self, event) -> None:
+        if event.command_name not in PROFILED_COMMANDS:
+            return
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        loop = self._loop
+        if pending is None or loop is None or duration_ms < self.threshold_ms:
+            return
+        database, command = pending
+        try:
+            loop.call_soon_threadsafe(self._record, event.command_name, database, command, duration_ms)
+        except RuntimeError:
+            # The loop closed while the command was in flight.
+            pass
+
+    # Bookkeeping, on the event loop.
+
+    def _record(self, command_name: str, database: str, command: dict, duration_ms: float) -> None:
+        shape = query_shape(command_name, command)
+        entry = self._shapes.get(shape)
+        if entry is None:
+            if len(self._shapes) >= MAX_SHAPES:
+                cheapest = min(self._shapes, key=lambda s: self._shapes[s]["total_ms"])
+                del self._shapes[cheapest]
+            entry = self._shapes[shape] = {
+                "shape": json.loads(shape),
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "last_seen": None,
+                "plan": None,
+                "docs_examined": None,
+                "keys_examined": None,
+                "docs_returned": None,
+                "examined_per_returned": None,
+            }
+            if self.explain:
+                try:
+                    self._queue.put_nowait((shape, command_name, database, command))
+                except asyncio.QueueFull:
+                    pass
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["last_seen"] = time.time()
+
+        logger.warning(
+            "Slow %s on %s: %.1f ms, shape=%s, plan=%s, examined/returned=%s",
+            command_name, entry["shape"]["collection"], duration_ms, shape,
+            entry["plan"] or "pending", entry["examined_per_returned"]
+        )
+
+    async def _explain_worker(self) -> None:
+        while True:
+            shape, command_name, database, command = await self._queue.get()
+            try:
+                await self._explain(shape, command_name, database, command)
+            except Exception as e:
+                logger.warning("Explain failed for %s: %s", shape, e)
+
+    async def _explain(self, shape: str, command_name: str, database: str, command: dict) -> None:
+        to_explain = {k: v for k, v in command.items() if k not in EXPLAIN_STRIP}
+        result = await self._client[database].command(
+            {"explain": to_explain, "verbosity": "executionStats"}
+        )
+        entry = self._shapes.get(shape)
+        if entry is None:
+            return
+
+        stats = _find_key(result, "executionStats") or {}
+        examined = stats.get("totalDocsExamined")
+        returned = stats.get("nReturned")
+        entry["plan"] = summarize_plan(_find_key(result, "winningPlan"))
+        entry["docs_examined"] = examined
+        entry["keys_examined"] = stats.get("totalKeysExamined")
+        entry["docs_returned"] = returned
+        if examined is not None and returned is not None:
+            entry["examined_per_returned"] = round(examined / max(returned, 1), 1)
+        logger.warning(
+            "Plan for slow %s on %s: %s, examined %s docs to return %s",
+            command_name, entry["shape"]["collection"], entry["plan"], examined, returned
+        )
+
+    def top(self, limit: int = 20) -> List[dict]:
+        """The slow shapes that cost the most time in total, worst first."""
+        ranked = sorted(self._shapes.values(), key=lambda e: e["total_ms"], reverse=True)[:limit]
+        return [
+            {
+                **entry,
+                "total_ms": round(entry["total_ms"], 1),
+                "max_ms": round(entry["max_ms"], 1),
+                "avg_ms": round(entry["total_ms"] / entry["count"], 1),
+            }
+            for entry in ranked
+        ]
@@ -0,0 +1,269 @@
+"""Per-user monthly spend totals, maintained incrementally.
+
+``monthly_rollups`` holds one document per ``(user_id, month, category)`` with
+the ``total`` amount and ``count`` of expenses in that bucket. Expense writes
+apply ``$inc`` deltas via :func:`apply_expense_change`; :func:`sync_rollups`
+recomputes buckets from the raw expenses to report (and optionally repair)
+drift.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# Drift below a tenth of a cent is float noise from repeated $inc.
+AMOUNT_TOLERANCE = 0.001
+MAX_REPORTED_DRIFT = 100
+# How often a repair that keeps losing races with expense writes is retried.
+REPAIR_ATTEMPTS = 3
+
+
+def expense_month(date) -> str:
+    if isinstance(date, str):
+        return date[:7]
+    return date.strftime("%Y-%m")
+
+
+def _bucket(expense: dict) -> Tuple[str, str, str]:
+    return expense["user_id"], expense_month(expense["date"]), expense["category"]
+
+
+def rollup_deltas(removed: Iterable[dict], added: Iterable[dict]) -> Dict[Tuple[str, str, str], List[float]]:
+    """Net change in ``[total, count]`` per bucket from taking ``removed`` out and putting ``added`` in."""
+    deltas: Dict[Tuple[str, str, str], List[float]] = defaultdict(lambda: [0.0, 0])
+    for expense in removed:
+        delta = deltas[_bucket(expense)]
+        delta[0] -= expense["amount"]
+        delta[1] -= 1
+    for expense in added:
+        delta = deltas[_bucket(expense)]
+        delta[0] += expense["amount"]
+        delta[1] += 1
+    return {bucket: delta for bucket, delta in deltas.items() if delta[0] or delta[1]}
+
+
+def _inc_ops(deltas: Dict[Tuple[str, str, str], List[float]]) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {"user_id": user_id, "month": month, "category": category},
+            {"$inc": {"total": total, "count": count}},
+            upsert=True
+        )
+        for (user_id, month, category), (total, count) in deltas.items()
+    ]
+
+
+def rollup_delta_ops(removed: Iterable[dict], added: Iterable[dict]) -> List[UpdateOne]:
+    """Build the $inc updates that take ``removed`` out of, and ``added`` into, their buckets.
+
+    Expenses falling in the same bucket are netted into a single update.
+    """
+    return _inc_ops(rollup_deltas(removed, added))
+
+
+async def apply_expense_change(db, old: Optional[dict], new: Optional[dict]) -> List[dict]:
+    """Move one expense between buckets; ``old``/``new`` is None on create/delete."""
+    return await apply_expense_changes(db, [old] if old else [], [new] if new else [])
+
+
+async def apply_expense_changes(db, removed: Iterable[dict], added: Iterable[dict]) -> List[dict]:
+    """Apply the deltas and return them as ``{month, category, total, count}`` changes."""
+    deltas = rollup_deltas(removed, added)
+    if deltas:
+        await db.monthly_rollups.bulk_write(_inc_ops(deltas), ordered=False)
+    return [
+        {"month": month, "category": category, "total": total, "count": count}
+        for (_, month, category), (total, count) in deltas.items()
+    ]
+
+
+async def read_rollups(db, user_id: str, first_month: str, last_month: str) -> List[dict]:
+    return await db.monthly_rollups.find(
+        {
+            "user_id": user_id,
+            "month": {"$gte": first_month, "$lte": last_month},
+            "count": {"$gt": 0}
+        },
+        {"_id": 0, "month": 1, "category": 1, "total": 1, "count": 1}
+    ).to_list(None)
+
+
+def _month_expr() -> dict:
+    # Handles expenses whose date is still a legacy ISO string.
+    return {"$cond": [
+        {"$eq": [{"$type": "$date"}, "string"]},
+        {"$substrBytes": ["$date", 0, 7]},
+        {"$dateToString": {"format": "%Y-%m", "date": "$date"}}
+    ]}
+
+
+def _matches(expected: Optional[dict], actual: Optional[dict]) -> bool:
+    expected = expected or {"total": 0.0, "count": 0}
+    actual = actual or {"total": 0.0, "count": 0}
+    return (
+        expected["count"] == actual["count"]
+        and math.isclose(expected["total"], actual["total"], abs_tol=AMOUNT_TOLERANCE)
+    )
+
+
+def _record_drift(report: dict, user_id: str, key: Tuple[str, str], want: Optional[dict], have: Optional[dict]) -> None:
+    report["drift_count"] += 1
+    if len(report["drift"]) < MAX_REPORTED_DRIFT:
+        month, category = key
+        report["drift"].append({
+            "user_id": user_id,
+            "month": month,
+            "category": category,
+            "expected": {k: want[k] for k in ("total", "count")} if want else None,
+            "actual": {k: have[k] for k in ("total", "count")} if have else None
+        })
+
+
+RepairHook = Optional[Callable[[str], Awaitable[None]]]
+
+
+async def _bucket_totals(db, user_id: str, month: str, category: str) -> Optional[dict]:
+    rows = await db.expenses.aggregate([
+        {"$match": {"user_id": user_id, "category": category}},
+        {"$match": {"$expr": {"$eq": [_month_expr(), month]}}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+    ]).to_list(1)
+    return rows[0] if rows else None
+
+
+async def _write_if_unchanged(db, selector: dict, want: Optional[dict], have: Optional[dict]) -> bool:
+    """Write ``want`` into the bucket only if it still holds ``have``."""
+    if have is None:
+        if want is None:
+            return True
+        try:
+            await db.monthly_rollups.insert_one({**selector, "total": want["total"], "count": want["count"]})
+        except DuplicateKeyError:
+            return False
+        return True
+    observed = {**selector, "total": have["total"], "count": have["count"]}
+    if want is None:
+        result = await db.monthly_rollups.delete_one(observed)
+        return result.deleted_count == 1
+    if _matches(want, have):
+        return True
+    result = await db.monthly_rollups.update_one(
+        observed, {"$set": {"total": want["total"], "count": want["count"]}}
+    )
+    return result.matched_count == 1
+
+
+async def _repair_bucket(db, user_id: str, month: str, category: str) -> bool:
+    """Recount one drifted bucket and overwrite it, unless an expense write gets in the way.
+
+    The bucket is read before its expenses are recounted and only written if
+    it still holds what was read, so an expense write landing in between
+    makes the attempt fail instead of having its $inc thrown away.
+    """
+    selector = {"user_id": user_id, "month": month, "category": category}
+    for _ in range(REPAIR_ATTEMPTS):
+        have = await db.monthly_rollups.find_one(selector, {"_id": 0, "total": 1, "count": 1})
+        want = await _bucket_totals(db, user_id, month, category)
+        if await _write_if_unchanged(db, selector, want, have):
+            return True
+    return False
+
+
+async def _sync_user(
+    db, user_id: str, expected: Dict[Tuple[str, str], dict], repair: bool, report: dict, on_repair: RepairHook
+) -> None:
+    actual = {
+        (row["month"], row["category"]): row
+        for row in await db.monthly_rollups.find(
+            {"user_id": user_id}, {"_id": 0, "month": 1, "category": 1, "total": 1, "count": 1}
+        ).to_list(None)
+    }
+    report["users_checked"] += 1
+    report["buckets_checked"] += len(expected.keys() | actual.keys())
+
+    # Repairs are conditional single-bucket writes rather than one bulk
+    # write, so each can tell whether it lost a race with the API. Drift is
+    # rare, so there are few of them.
+    repaired = 0
+    for key in expected.keys() | actual.keys():
+        want, have = expected.get(key), actual.get(key)
+        month, category = key
+        if want is None:
+            # Empty buckets are harmless; only report ones that claim spend.
+            if not _matches(None, have):
+                _record_drift(report, user_id, key, None, have)
+        elif _matches(want, have):
+            continue
+        else:
+            _record_drift(report, user_id, key, want, have)
+        if not repair:
+            continue
+        # The expected totals were counted before the rollups were read, so
+        # an expense written in between looks like drift; recount first.
+        if await _repair_bucket(db, user_id, month, category):
+            repaired += 1
+        else:
+            report["buckets_unrepaired"] += 1
+
+    report["buckets_repaired"] += repaired
+    if repaired and on_repair is not None:
+        await on_repair(user_id)
+
+
+async def sync_rollups(
+    db, user_id: Optional[str] = None, repair: bool = False, on_repair: RepairHook = None
+) -> dict:
+    """Recompute rollups from raw expenses and report buckets that drifted.
+
+    With ``repair=True`` drifted buckets are overwritten with the recomputed
+    values, buckets without expenses are removed and ``on_repair(user_id)``
+    is awaited for each user whose rollups changed. A bucket is only written
+    if it still holds what was read, so repairs are safe on live data; one
+    that keeps changing underneath is counted in ``buckets_unrepaired``.
+    Users are processed one at a time, so memory is bounded by the largest
+    single user's bucket count.
+    """
+    report = {
+        "users_checked": 0,
+        "buckets_checked": 0,
+        "buckets_repaired": 0,
+        "buckets_unrepaired": 0,
+        "drift_count": 0,
+        "drift": [],
+        "started_at": datetime.now(timezone.utc).isoformat()
+    }
+
+    match = {"user_id": user_id} if user_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "month": _month_expr(), "category": "$category"},
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.user_id": 1}}
+    ]
+
+    seen_users = set()
+    current_user, expected = None, {}
+    async for row in db.expenses.aggregate(pipeline, allowDiskUse=True):
+        row_user = row["_id"]["user_id"]
+        if row_user != current_user:
+            if current_user is not None:
+                await _sync_user(db, current_user, expected, repair, report, on_repair)
+            seen_users.add(row_user)
+            current_user, expected = row_user, {}
+        expected[(row["_id"]["month"], row["_id"]["category"])] = row
+    if current_user is not None:
+        await _sync_user(db, current_user, expected, repair, report, on_repair)
+
+    # Users that have rollups but no expenses left at all.
+    async for row in db.monthly_rollups.aggregate([{"$match": match}, {"$group": {"_id": "$user_id"}}]):
+        if row["_id"] not in seen_users:
+            await _sync_user(db, row["_id"], {}, repair, report, on_repair)
+
+    report["finished_at"] = datetime.now(timezone.utc).isoformat()
+    return report
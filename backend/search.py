@@ -0,0 +1,60 @@
+"""Expense search over titles and notes.
+
+Whole words go through the text index on ``expenses``, which stems them
+("coffees" finds "Coffee") and ranks matches by relevance, with title matches
+weighing more than notes. The text index cannot match part of a word, so if
+it finds nothing the query words are matched as prefixes of ``search_terms``
+instead: the lowercased words of the title and notes, stored on each expense
+by :func:`search_terms` and indexed together with ``user_id``.
+"""
+import re
+from typing import List, Optional
+
+WORD_RE = re.compile(r"\w+")
+MAX_QUERY_WORDS = 10
+# Notes are free text; past this many distinct words the rest are not indexed.
+MAX_TERMS = 100
+
+TEXT = "text"
+PREFIX = "prefix"
+
+
+def search_terms(title: str, notes: Optional[str] = None) -> List[str]:
+    """Distinct lowercased words of an expense's title and notes."""
+    words = dict.fromkeys(WORD_RE.findall(f"{title} {notes or ''}".lower()))
+    return list(words)[:MAX_TERMS]
+
+
+def query_words(q: str) -> List[str]:
+    return list(dict.fromkeys(WORD_RE.findall(q.lower())))[:MAX_QUERY_WORDS]
+
+
+def prefix_filter(words: List[str]) -> dict:
+    """Expenses with a term starting with each of ``words``.
+
+    Anchored, case-sensitive patterns turn into index range scans.
+    """
+    conditions = [{"search_terms": re.compile("^" + re.escape(word))} for word in words]
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def text_pipeline(match: dict, q: str, after: Optional[dict], limit: int, projection: dict) -> List[dict]:
+    """Text matches by descending relevance, resuming after ``after`` ({score, id}).
+
+    Ties on score are broken by expense_id so every page boundary is exact.
+    """
+    pipeline = [
+        {"$match": {**match, "$text": {"$search": q}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after:
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": after["score"]}},
+            {"score": after["score"], "expense_id": {"$lt": after["id"]}},
+        ]}})
+    pipeline += [
+        {"$sort": {"score": -1, "expense_id": -1}},
+        {"$limit": limit},
+        {"$project": projection},
+    ]
+    return pipeline
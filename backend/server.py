@@ -1,27 +1,114 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteMany, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import Dict, List, Optional, Tuple, Union
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
 from io import BytesIO
 import json
+import base64
+import asyncio
+import hashlib
+from cache import cache_from_url
+from upstream import UpstreamClient
+from indexes import ensure_indexes
+from exports import ARROW_AVAILABLE, EXPORT_BATCH_SIZE, EXPORT_FIELDS, EXPORT_FORMATS
+from rollups import apply_expense_change, apply_expense_changes, expense_month, read_rollups, sync_rollups
+from jobs import SUCCEEDED, JobContext, JobRunner
+from events import RESYNC, EventBroker
+from migrations import migrate_dates, parse_iso_datetime
+from gridfs.errors import NoFile
+import analytics
+import bulk_import
+import search
+import metrics
+from profiler import SlowQueryProfiler
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+
+# Opt-in: log find/aggregate calls slower than this many milliseconds, with
+# their explain plan, and list the worst at /debug/slow-queries.
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '0'))
+slow_queries = SlowQueryProfiler(
+    SLOW_QUERY_MS,
+    explain=os.environ.get('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+) if SLOW_QUERY_MS > 0 else None
+
+# The pool is per process: with several gunicorn workers the cluster can see
+# up to workers x MONGO_MAX_POOL_SIZE connections. Motor connects lazily, so
+# preloading the app in the gunicorn master opens no sockets before fork.
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000')),
+    event_listeners=[metrics.MongoCommandListener()] + ([slow_queries] if slow_queries else [])
+)
 db = client[os.environ['DB_NAME']]
 
-app = FastAPI()
+# Shared by all workers when CACHE_URL points at Redis, in-process otherwise.
+cache = cache_from_url(
+    os.environ.get('CACHE_URL'),
+    maxsize=int(os.environ.get('CACHE_SIZE', '10000'))
+)
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '60'))
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '300'))
+if not cache.shared:
+    # An in-process cache never hears about writes or logouts handled by
+    # other workers. Per-user entries are then keyed by the data version,
+    # read from MongoDB on every request, and sessions are only trusted for
+    # a few seconds.
+    SESSION_CACHE_TTL = min(SESSION_CACHE_TTL, float(os.environ.get('LOCAL_SESSION_CACHE_TTL', '5')))
+
+# Each worker runs up to JOB_CONCURRENCY background jobs at once. A job whose
+# worker stops renewing its lease for JOB_LEASE_SECONDS is taken over by
+# another worker; idle workers look for queued jobs every JOB_POLL_INTERVAL.
+job_runner = JobRunner(
+    concurrency=int(os.environ.get('JOB_CONCURRENCY', '2')),
+    lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', '30')),
+    poll_interval=float(os.environ.get('JOB_POLL_INTERVAL', '5')),
+    retention=timedelta(days=float(os.environ.get('JOB_RETENTION_DAYS', '7')))
+)
+MAX_ACTIVE_JOBS = int(os.environ.get('MAX_ACTIVE_JOBS_PER_USER', '5'))
+
+# Live updates at /api/events. EVENTS_MODE=auto uses Mongo change streams
+# when the database is a replica set, so every worker sees every event.
+live_events = EventBroker(
+    mode=os.environ.get('EVENTS_MODE', 'auto'),
+    keepalive=float(os.environ.get('EVENTS_KEEPALIVE', '15'))
+)
+
+OAUTH_SESSION_URL = "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data"
+
+oauth_client = UpstreamClient(
+    "oauth",
+    connect_timeout=float(os.environ.get('OAUTH_CONNECT_TIMEOUT', '3')),
+    read_timeout=float(os.environ.get('OAUTH_READ_TIMEOUT', '10')),
+    max_connections=int(os.environ.get('OAUTH_POOL_SIZE', '20')),
+    max_retries=int(os.environ.get('OAUTH_MAX_RETRIES', '2'))
+)
+
+# Expenses written before dates were stored natively still hold ISO strings
+# until `python manage.py migrate-dates` has converted them. BSON compares by
+# type first, so those need their own (string) range in month filters.
+DATE_STRING_FALLBACK = os.environ.get('DATE_STRING_FALLBACK', 'true').lower() == 'true'
+
+# Create missing indexes in the background when a worker starts.
+ENSURE_INDEXES_ON_STARTUP = os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 class User(BaseModel):
@@ -68,6 +155,56 @@ class Budget(BaseModel):
     month: str
     created_at: datetime
 
+class BudgetStatus(Budget):
+    spent: float
+    remaining: float
+    percent_used: Optional[float] = None
+    over_budget: bool
+
+class MonthBudgetStatus(BaseModel):
+    month: str
+    budgets: List[BudgetStatus]
+    total_budget: float
+    total_spent: float
+    total_remaining: float
+    over_budget_count: int
+
+class Job(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    job_id: str
+    user_id: str
+    kind: str
+    params: Dict
+    status: str
+    progress: Dict
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+class ExpensePage(BaseModel):
+    items: List[Expense]
+    next_cursor: Optional[str] = None
+
+class ExpenseMatch(Expense):
+    score: Optional[float] = None
+
+class SearchResults(BaseModel):
+    mode: str
+    items: List[ExpenseMatch]
+    next_cursor: Optional[str] = None
+
+class Dashboard(BaseModel):
+    month: str
+    user: User
+    expenses: List[Expense]
+    categories: List[Category]
+    budgets: List[BudgetStatus]
+    stats: Dict
+
 class ExpenseCreate(BaseModel):
     title: str
     amount: float
@@ -84,6 +221,97 @@ class BudgetCreate(BaseModel):
     amount: float
     month: str
 
+class BudgetAmount(BaseModel):
+    category: str
+    amount: float
+
+class MonthBudgets(BaseModel):
+    month: str
+    budgets: List[BudgetAmount]
+
+class JobCreate(BaseModel):
+    kind: str
+    params: Dict = Field(default_factory=dict)
+
+def parse_expense_date(value: str) -> datetime:
+    try:
+        return parse_iso_datetime(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+
+def month_bounds(month: str) -> tuple:
+    try:
+        start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month, expected YYYY-MM")
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+def date_range_filter(start: datetime, end: datetime) -> dict:
+    date_range = {"date": {"$gte": start, "$lt": end}}
+    if not DATE_STRING_FALLBACK:
+        return date_range
+    string_range = {"date": {"$gte": start.strftime("%Y-%m"), "$lt": end.strftime("%Y-%m")}}
+    return {"$or": [date_range, string_range]}
+
+def month_filter(month: str) -> dict:
+    return date_range_filter(*month_bounds(month))
+
+def date_key_expr(fmt: str) -> dict:
+    """Aggregation expression rendering an expense's date with a strftime-style format."""
+    expr = {"$dateToString": {"format": fmt, "date": "$date"}}
+    if not DATE_STRING_FALLBACK:
+        return expr
+    # Legacy ISO strings already start with the formatted prefix.
+    prefix_len = len(datetime(2000, 1, 1).strftime(fmt))
+    return {"$cond": [
+        {"$eq": [{"$type": "$date"}, "string"]},
+        {"$substrBytes": ["$date", 0, prefix_len]},
+        expr
+    ]}
+
+EXPENSE_SORT = [("date", -1), ("expense_id", -1)]
+# search_terms only exists to serve the search index.
+EXPENSE_FIELDS = {"_id": 0, "search_terms": 0}
+
+def encode_expense_cursor(expense: dict) -> str:
+    date = expense["date"]
+    payload = {
+        "date": date if isinstance(date, str) else date.isoformat(),
+        "legacy": isinstance(date, str),
+        "id": expense["expense_id"]
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def expense_cursor_filter(cursor: str) -> dict:
+    """Filter for expenses strictly after ``cursor`` in EXPENSE_SORT order."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        date = payload["date"] if payload["legacy"] else datetime.fromisoformat(payload["date"])
+        expense_id = payload["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    after = [
+        {"date": {"$lt": date}},
+        {"date": date, "expense_id": {"$lt": expense_id}}
+    ]
+    # Descending order puts native dates before legacy strings, and $lt on a
+    # date never matches a string, so strings are all "after" a date cursor.
+    if DATE_STRING_FALLBACK and not payload["legacy"]:
+        after.append({"date": {"$type": "string"}})
+    return {"$or": after}
+
+def parse_stored_dates(doc: dict, *fields: str) -> dict:
+    """Parse legacy ISO-string date fields; native BSON dates are left untouched."""
+    for field in fields:
+        if isinstance(doc.get(field), str):
+            doc[field] = datetime.fromisoformat(doc[field])
+    return doc
+
 async def get_current_user(request: Request) -> str:
     session_token = request.cookies.get("session_token")
     if not session_token:
@@ -94,6 +322,10 @@ async def get_current_user(request: Request) -> str:
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    cached_user_id = await cache.get(f"session:{session_token}")
+    if cached_user_id is not None:
+        return cached_user_id
+    
     session_doc = await db.user_sessions.find_one(
         {"session_token": session_token},
         {"_id": 0}
@@ -111,8 +343,115 @@ async def get_current_user(request: Request) -> str:
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
+    ttl = min(SESSION_CACHE_TTL, (expires_at - datetime.now(timezone.utc)).total_seconds())
+    await cache.set(f"session:{session_token}", session_doc["user_id"], ttl)
     return session_doc["user_id"]
 
+PREDEFINED_CATEGORIES = [
+    {"name": "Food", "color": "#E15554"},
+    {"name": "Transport", "color": "#3D9970"},
+    {"name": "Bills", "color": "#2E4F4F"},
+    {"name": "Shopping", "color": "#F59E0B"},
+    {"name": "Entertainment", "color": "#8B5CF6"},
+    {"name": "Healthcare", "color": "#EC4899"},
+    {"name": "Other", "color": "#6B7280"}
+]
+
+async def provision_predefined_categories(user_id: str, created_at: datetime):
+    # Category ids are derived from (user_id, name), so re-running this for
+    # the same user only hits the unique (user_id, category_id) index.
+    category_docs = [
+        {
+            "category_id": "cat_" + uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}/{cat['name']}").hex[:12],
+            "user_id": user_id,
+            "name": cat["name"],
+            "color": cat["color"],
+            "is_predefined": True,
+            "created_at": created_at
+        }
+        for cat in PREDEFINED_CATEGORIES
+    ]
+    try:
+        await db.categories.insert_many(category_docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+            raise
+    # Until this is set every login retries, so a failure or crash part way
+    # through never leaves the user without categories.
+    await db.users.update_one({"user_id": user_id}, {"$set": {"categories_provisioned": True}})
+
+async def load_data_version(user_id: str) -> int:
+    doc = await db.data_versions.find_one({"_id": user_id})
+    return doc["version"] if doc else 0
+
+async def get_data_version(user_id: str) -> int:
+    if not cache.shared:
+        return await load_data_version(user_id)
+    return await cache.get_or_load(user_id, "data_version", lambda: load_data_version(user_id), STATS_CACHE_TTL)
+
+async def cached_for_user(user_id: str, name: str, loader):
+    """Load ``name`` for the user through the cache, for up to STATS_CACHE_TTL.
+
+    Writes through any worker make the next call load afresh: a shared cache
+    is invalidated by bump_data_version, an in-process one is keyed by the
+    current data version instead.
+    """
+    if not cache.shared:
+        name = f"{name}:v{await get_data_version(user_id)}"
+    return await cache.get_or_load(user_id, name, loader, STATS_CACHE_TTL)
+
+async def bump_data_version(user_id: str):
+    """Invalidate every ETag handed out for this user's data.
+
+    Mutating routes call this after their write, and readers fetch the
+    version before their data, so an ETag can only ever be older than the
+    body it was sent with, never newer.
+    """
+    await db.data_versions.update_one({"_id": user_id}, {"$inc": {"version": 1}}, upsert=True)
+    await cache.invalidate_user(user_id)
+
+# Users whose rollups are known to cover all of their expenses. The flag is
+# never cleared, so each worker only has to look it up once per user.
+rollups_ready_users = set()
+
+async def ensure_rollups(user_id: str):
+    """Build the user's rollups from their expenses the first time they are read.
+
+    Users with expenses from before rollups existed would otherwise see zero
+    totals until rebuild-rollups had been run for them. Bumping the data
+    version retires any ETag handed out for those empty totals.
+    """
+    if user_id in rollups_ready_users:
+        return
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "rollups_ready": 1})
+    if not (user or {}).get("rollups_ready"):
+        try:
+            await sync_rollups(db, user_id=user_id, repair=True, on_repair=bump_data_version)
+        except Exception as e:
+            # Serve what the rollups have; the next read tries again.
+            logger.warning(f"Building rollups for {user_id} failed: {e}")
+            return
+        await db.users.update_one({"user_id": user_id}, {"$set": {"rollups_ready": True}})
+    rollups_ready_users.add(user_id)
+
+async def check_not_modified(request: Request, user_id: str) -> Tuple[Optional[Response], dict]:
+    """Build the ETag for this request and short-circuit matching If-None-Match.
+
+    Returns a 304 response (or None) plus the caching headers to send with
+    a full response.
+    """
+    await ensure_rollups(user_id)
+    version = await get_data_version(user_id)
+    key = f"{user_id}:{version}:{request.url.path}?{sorted(request.query_params.multi_items())}"
+    etag = '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Cookie, Authorization"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers), headers
+    return None, headers
+
 @api_router.post("/auth/session")
 async def exchange_session(request: Request, response: Response):
     body = await request.json()
@@ -121,68 +460,56 @@ async def exchange_session(request: Request, response: Response):
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id required")
     
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-            headers={"X-Session-ID": session_id}
+    try:
+        resp = await oauth_client.get(OAUTH_SESSION_URL, headers={"X-Session-ID": session_id})
+    except httpx.HTTPError as e:
+        logger.error(f"OAuth session exchange failed: {e!r}")
+        raise HTTPException(status_code=502, detail="Authentication provider unavailable")
+    
+    if resp.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid session_id")
+    
+    data = resp.json()
+    
+    now = datetime.now(timezone.utc)
+    new_user_id = f"user_{uuid.uuid4().hex[:12]}"
+    user_update = {
+        "$set": {"name": data["name"], "picture": data.get("picture")},
+        "$setOnInsert": {
+            "user_id": new_user_id, "email": data["email"], "created_at": now,
+            "categories_provisioned": False, "rollups_ready": True
+        }
+    }
+    try:
+        user = await db.users.find_one_and_update(
+            {"email": data["email"]}, user_update,
+            projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
         )
-        
-        if resp.status_code != 200:
-            raise HTTPException(status_code=401, detail="Invalid session_id")
-        
-        data = resp.json()
-    
-    user_id = f"user_{uuid.uuid4().hex[:12]}"
-    existing_user = await db.users.find_one({"email": data["email"]}, {"_id": 0})
-    
-    if existing_user:
-        user_id = existing_user["user_id"]
-        await db.users.update_one(
-            {"email": data["email"]},
-            {"$set": {
-                "name": data["name"],
-                "picture": data.get("picture")
-            }}
+    except DuplicateKeyError:
+        # A concurrent first login for the same email won the upsert race;
+        # the unique email index turned ours into an error, so just update.
+        user = await db.users.find_one_and_update(
+            {"email": data["email"]}, {"$set": user_update["$set"]},
+            projection={"_id": 0}, return_document=ReturnDocument.AFTER
         )
-    else:
-        user_doc = {
-            "user_id": user_id,
-            "email": data["email"],
-            "name": data["name"],
-            "picture": data.get("picture"),
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.users.insert_one(user_doc)
-        
-        predefined_categories = [
-            {"name": "Food", "color": "#E15554"},
-            {"name": "Transport", "color": "#3D9970"},
-            {"name": "Bills", "color": "#2E4F4F"},
-            {"name": "Shopping", "color": "#F59E0B"},
-            {"name": "Entertainment", "color": "#8B5CF6"},
-            {"name": "Healthcare", "color": "#EC4899"},
-            {"name": "Other", "color": "#6B7280"}
-        ]
-        
-        for cat in predefined_categories:
-            cat_doc = {
-                "category_id": f"cat_{uuid.uuid4().hex[:12]}",
-                "user_id": user_id,
-                "name": cat["name"],
-                "color": cat["color"],
-                "is_predefined": True,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.categories.insert_one(cat_doc)
+    user_id = user["user_id"]
+    
+    # Users from before the flag existed were provisioned when they signed up.
+    if user.get("categories_provisioned") is False:
+        await provision_predefined_categories(user_id, now)
+    await bump_data_version(user_id)
     
     session_token = data["session_token"]
     session_doc = {
         "user_id": user_id,
         "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "expires_at": now + timedelta(days=7),
+        "created_at": now
     }
-    await db.user_sessions.insert_one(session_doc)
+    # Upsert so a retried exchange of the same session is not a duplicate-key error.
+    await db.user_sessions.update_one(
+        {"session_token": session_token}, {"$setOnInsert": session_doc}, upsert=True
+    )
     
     response.set_cookie(
         key="session_token",
@@ -194,52 +521,165 @@ async def exchange_session(request: Request, response: Response):
         max_age=7*24*60*60
     )
     
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-    if user and isinstance(user.get("created_at"), str):
-        user["created_at"] = datetime.fromisoformat(user["created_at"])
-    
-    return User(**user)
+    return User(**parse_stored_dates(user, "created_at"))
 
-@api_router.get("/auth/me")
-async def get_me(request: Request):
-    user_id = await get_current_user(request)
+async def load_user(user_id: str) -> User:
     user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user.get("created_at"), str):
-        user["created_at"] = datetime.fromisoformat(user["created_at"])
-    
-    return User(**user)
+    return User(**parse_stored_dates(user, "created_at"))
+
+@api_router.get("/auth/me")
+async def get_me(request: Request):
+    user_id = await get_current_user(request)
+    return await load_user(user_id)
 
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     
     if session_token:
+        await cache.delete(f"session:{session_token}")
         await db.user_sessions.delete_one({"session_token": session_token})
     
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out"}
 
-@api_router.get("/expenses")
-async def get_expenses(request: Request, month: Optional[str] = None):
-    user_id = await get_current_user(request)
-    
+async def list_expenses(user_id: str, month: Optional[str] = None) -> list:
     query = {"user_id": user_id}
     if month:
-        query["date"] = {"$regex": f"^{month}"}
+        query.update(month_filter(month))
     
-    expenses = await db.expenses.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
+    expenses = await db.expenses.find(query, EXPENSE_FIELDS).sort(EXPENSE_SORT).to_list(1000)
+    return [parse_stored_dates(exp, "date", "created_at") for exp in expenses]
+
+@api_router.get("/expenses", response_model=Union[List[Expense], ExpensePage])
+async def get_expenses(
+    request: Request,
+    month: Optional[str] = None,
+    paginate: bool = False,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    user_id = await get_current_user(request)
+    not_modified, cache_headers = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
     
-    for exp in expenses:
-        if isinstance(exp.get("date"), str):
-            exp["date"] = datetime.fromisoformat(exp["date"])
-        if isinstance(exp.get("created_at"), str):
-            exp["created_at"] = datetime.fromisoformat(exp["created_at"])
+    if not paginate:
+        return ORJSONResponse(await list_expenses(user_id, month), headers=cache_headers)
     
-    return expenses
+    query = {"user_id": user_id}
+    if month:
+        query.update(month_filter(month))
+    if cursor:
+        query = {"$and": [query, expense_cursor_filter(cursor)]}
+    
+    # One extra row tells us whether another page exists.
+    expenses = await db.expenses.find(query, EXPENSE_FIELDS).sort(EXPENSE_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        next_cursor = encode_expense_cursor(expenses[-1])
+    
+    return ORJSONResponse({
+        "items": [parse_stored_dates(exp, "date", "created_at") for exp in expenses],
+        "next_cursor": next_cursor
+    }, headers=cache_headers)
+
+def encode_search_cursor(mode: str, expense: dict) -> str:
+    payload = {"mode": mode}
+    if mode == search.TEXT:
+        payload.update(score=expense["score"], id=expense["expense_id"])
+    else:
+        payload["after"] = encode_expense_cursor(expense)
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_search_cursor(cursor: str) -> dict:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        mode = payload["mode"]
+        if mode == search.TEXT:
+            payload["score"] = float(payload["score"])
+            payload["id"] = str(payload["id"])
+        elif mode == search.PREFIX:
+            payload["after"] = str(payload["after"])
+        else:
+            raise ValueError(mode)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return payload
+
+@api_router.get("/expenses/search", response_model=SearchResults)
+async def search_expenses(
+    request: Request,
+    q: str = Query(..., max_length=200),
+    category: Optional[List[str]] = Query(None),
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """Search titles and notes across the user's whole history.
+
+    Whole words are ranked by relevance (``mode: "text"``). If they match
+    nothing, the words are matched as prefixes and results come newest first
+    (``mode: "prefix"``). ``next_cursor`` continues in the same mode.
+    """
+    user_id = await get_current_user(request)
+    words = search.query_words(q)
+    if not words:
+        raise HTTPException(status_code=400, detail="q must contain at least one word")
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise HTTPException(status_code=400, detail="min_amount must not be above max_amount")
+    after = decode_search_cursor(cursor) if cursor else None
+    not_modified, cache_headers = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+    
+    match = {"user_id": user_id}
+    if category:
+        match["category"] = {"$in": category}
+    amount = {}
+    if min_amount is not None:
+        amount["$gte"] = min_amount
+    if max_amount is not None:
+        amount["$lte"] = max_amount
+    if amount:
+        match["amount"] = amount
+    
+    mode = after["mode"] if after else search.TEXT
+    expenses = []
+    if mode == search.TEXT:
+        pipeline = search.text_pipeline(match, " ".join(words), after, limit + 1, EXPENSE_FIELDS)
+        try:
+            expenses = await db.expenses.aggregate(pipeline).to_list(limit + 1)
+        except OperationFailure as e:
+            # Without the text index (still building, or failed to) prefix
+            # matching is all that works.
+            if after:
+                raise
+            logger.warning(f"Text search failed, matching prefixes instead: {e}")
+        if not expenses and not after:
+            mode = search.PREFIX
+    if mode == search.PREFIX:
+        query = {**match, **search.prefix_filter(words)}
+        if after:
+            query = {"$and": [query, expense_cursor_filter(after["after"])]}
+        expenses = await db.expenses.find(query, EXPENSE_FIELDS).sort(EXPENSE_SORT).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        next_cursor = encode_search_cursor(mode, expenses[-1])
+    
+    return ORJSONResponse({
+        "mode": mode,
+        "items": [parse_stored_dates(exp, "date", "created_at") for exp in expenses],
+        "next_cursor": next_cursor
+    }, headers=cache_headers)
 
 @api_router.post("/expenses")
 async def create_expense(request: Request, expense_data: ExpenseCreate):
@@ -251,69 +691,215 @@ async def create_expense(request: Request, expense_data: ExpenseCreate):
         "title": expense_data.title,
         "amount": expense_data.amount,
         "category": expense_data.category,
-        "date": expense_data.date,
+        "date": parse_expense_date(expense_data.date),
         "notes": expense_data.notes,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "search_terms": search.search_terms(expense_data.title, expense_data.notes),
+        "created_at": datetime.now(timezone.utc)
     }
     
     await db.expenses.insert_one(expense_doc)
+    changes = await apply_expense_change(db, None, expense_doc)
+    await bump_data_version(user_id)
+    
+    expense = Expense(**expense_doc)
+    await live_events.publish(
+        user_id,
+        ("expense.created", {"expense": expense.model_dump()}),
+        ("stats.changed", {"changes": changes})
+    )
+    return expense
+
+BULK_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+def describe_row_error(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+        )
+    if isinstance(error, HTTPException):
+        return error.detail
+    return str(error)
+
+async def bulk_upload_rows(request: Request):
+    """Pick a row parser for the upload, either a raw body or a multipart ``file`` field."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart upload needs a 'file' field")
+        content_type = (upload.content_type or "").lower()
+        if content_type not in bulk_import.PARSERS:
+            extension = Path(upload.filename or "").suffix.lower()
+            content_type = bulk_import.EXTENSIONS.get(extension, content_type)
+        
+        async def chunks():
+            while True:
+                chunk = await upload.read(65536)
+                if not chunk:
+                    break
+                yield chunk
+    else:
+        chunks = request.stream
     
-    if isinstance(expense_doc.get("date"), str):
-        expense_doc["date"] = datetime.fromisoformat(expense_doc["date"])
-    if isinstance(expense_doc.get("created_at"), str):
-        expense_doc["created_at"] = datetime.fromisoformat(expense_doc["created_at"])
+    parser = bulk_import.PARSERS.get(content_type)
+    if parser is None:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type, use one of {', '.join(bulk_import.PARSERS)}"
+        )
+    return parser(chunks())
+
+@api_router.post("/expenses/bulk")
+async def bulk_create_expenses(request: Request):
+    user_id = await get_current_user(request)
+    rows = await bulk_upload_rows(request)
+    
+    inserted = 0
+    failed = 0
+    errors = []
+    months = set()
+    
+    def record_error(row_number: int, error: Exception):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "error": describe_row_error(error)})
+    
+    async def flush(batch: list):
+        nonlocal inserted
+        docs = [doc for _, doc in batch]
+        written = docs
+        try:
+            result = await db.expenses.insert_many(docs, ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            failed_indexes = {err["index"]: err["errmsg"] for err in e.details["writeErrors"]}
+            for index, message in sorted(failed_indexes.items()):
+                record_error(batch[index][0], Exception(message))
+            written = [doc for index, doc in enumerate(docs) if index not in failed_indexes]
+            inserted += e.details["nInserted"]
+        await apply_expense_changes(db, [], written)
+        months.update(expense_month(doc["date"]) for doc in written)
+    
+    created_at = datetime.now(timezone.utc)
+    batch = []
+    try:
+        async for row_number, fields in rows:
+            if isinstance(fields, Exception):
+                record_error(row_number, fields)
+                continue
+            try:
+                expense_data = ExpenseCreate(**fields)
+                date = parse_expense_date(expense_data.date)
+            except (ValidationError, HTTPException) as e:
+                record_error(row_number, e)
+                continue
+            
+            batch.append((row_number, {
+                "expense_id": f"exp_{uuid.uuid4().hex[:12]}",
+                "user_id": user_id,
+                "title": expense_data.title,
+                "amount": expense_data.amount,
+                "category": expense_data.category,
+                "date": date,
+                "notes": expense_data.notes,
+                "search_terms": search.search_terms(expense_data.title, expense_data.notes),
+                "created_at": created_at
+            }))
+            if len(batch) == BULK_BATCH_SIZE:
+                await flush(batch)
+                batch = []
+    except ValueError as e:
+        # The body itself is malformed (e.g. not a JSON array).
+        if not inserted and not batch:
+            raise HTTPException(status_code=400, detail=str(e))
+        record_error(0, e)
+    
+    if batch:
+        await flush(batch)
+    if inserted:
+        await bump_data_version(user_id)
+        # Too many to send one by one; clients showing these months reload.
+        await live_events.publish(user_id, ("expenses.imported", {"inserted": inserted, "months": sorted(months)}))
     
-    return Expense(**expense_doc)
+    return {
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors)
+    }
 
 @api_router.put("/expenses/{expense_id}")
 async def update_expense(request: Request, expense_id: str, expense_data: ExpenseCreate):
     user_id = await get_current_user(request)
     
-    result = await db.expenses.update_one(
+    updates = {
+        "title": expense_data.title,
+        "amount": expense_data.amount,
+        "category": expense_data.category,
+        "date": parse_expense_date(expense_data.date),
+        "notes": expense_data.notes,
+        "search_terms": search.search_terms(expense_data.title, expense_data.notes)
+    }
+    previous = await db.expenses.find_one_and_update(
         {"expense_id": expense_id, "user_id": user_id},
-        {"$set": {
-            "title": expense_data.title,
-            "amount": expense_data.amount,
-            "category": expense_data.category,
-            "date": expense_data.date,
-            "notes": expense_data.notes
-        }}
+        {"$set": updates},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    expense = await db.expenses.find_one({"expense_id": expense_id}, {"_id": 0})
+    expense = {**previous, **updates}
+    changes = await apply_expense_change(db, previous, expense)
+    await bump_data_version(user_id)
     
-    if isinstance(expense.get("date"), str):
-        expense["date"] = datetime.fromisoformat(expense["date"])
-    if isinstance(expense.get("created_at"), str):
-        expense["created_at"] = datetime.fromisoformat(expense["created_at"])
-    
-    return Expense(**expense)
+    expense = Expense(**parse_stored_dates(expense, "created_at"))
+    await live_events.publish(
+        user_id,
+        ("expense.updated", {"expense": expense.model_dump()}),
+        ("stats.changed", {"changes": changes})
+    )
+    return expense
 
 @api_router.delete("/expenses/{expense_id}")
 async def delete_expense(request: Request, expense_id: str):
     user_id = await get_current_user(request)
     
-    result = await db.expenses.delete_one({"expense_id": expense_id, "user_id": user_id})
+    deleted = await db.expenses.find_one_and_delete(
+        {"expense_id": expense_id, "user_id": user_id},
+        projection={"_id": 0}
+    )
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    changes = await apply_expense_change(db, deleted, None)
+    await bump_data_version(user_id)
+    
+    await live_events.publish(
+        user_id,
+        ("expense.deleted", {"expense_id": expense_id, "month": expense_month(deleted["date"])}),
+        ("stats.changed", {"changes": changes})
+    )
     return {"message": "Expense deleted"}
 
-@api_router.get("/categories")
+async def list_categories(user_id: str) -> list:
+    categories = await db.categories.find({"user_id": user_id}, {"_id": 0}).to_list(100)
+    return [parse_stored_dates(cat, "created_at") for cat in categories]
+
+@api_router.get("/categories", response_model=List[Category])
 async def get_categories(request: Request):
     user_id = await get_current_user(request)
-    
-    categories = await db.categories.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    
-    for cat in categories:
-        if isinstance(cat.get("created_at"), str):
-            cat["created_at"] = datetime.fromisoformat(cat["created_at"])
-    
-    return categories
+    not_modified, cache_headers = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+    categories = await cached_for_user(user_id, "categories", lambda: list_categories(user_id))
+    return ORJSONResponse(categories, headers=cache_headers)
 
 @api_router.post("/categories")
 async def create_category(request: Request, category_data: CategoryCreate):
@@ -325,15 +911,15 @@ async def create_category(request: Request, category_data: CategoryCreate):
         "name": category_data.name,
         "color": category_data.color,
         "is_predefined": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     await db.categories.insert_one(category_doc)
+    await bump_data_version(user_id)
     
-    if isinstance(category_doc.get("created_at"), str):
-        category_doc["created_at"] = datetime.fromisoformat(category_doc["created_at"])
-    
-    return Category(**category_doc)
+    category = Category(**category_doc)
+    await live_events.publish(user_id, ("category.created", {"category": category.model_dump()}))
+    return category
 
 @api_router.delete("/categories/{category_id}")
 async def delete_category(request: Request, category_id: str):
@@ -352,101 +938,436 @@ async def delete_category(request: Request, category_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
     
+    await bump_data_version(user_id)
+    
+    await live_events.publish(user_id, ("category.deleted", {"category_id": category_id}))
     return {"message": "Category deleted"}
 
-@api_router.get("/budgets")
-async def get_budgets(request: Request):
-    user_id = await get_current_user(request)
-    
-    budgets = await db.budgets.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    
-    for budget in budgets:
-        if isinstance(budget.get("created_at"), str):
-            budget["created_at"] = datetime.fromisoformat(budget["created_at"])
+async def list_budgets(user_id: str, month: Optional[str] = None) -> list:
+    query = {"user_id": user_id}
+    if month:
+        query["month"] = month
     
-    return budgets
+    budgets = await db.budgets.find(query, {"_id": 0}).to_list(None)
+    return [parse_stored_dates(budget, "created_at") for budget in budgets]
+
+async def budget_status(user_id: str, month: str) -> list:
+    """The month's budgets joined to actual spend from monthly_rollups, in one aggregation."""
+    pipeline = [
+        {"$match": {"user_id": user_id, "month": month}},
+        {"$lookup": {
+            "from": "monthly_rollups",
+            "let": {"category": "$category"},
+            "pipeline": [
+                # user_id and month hit the rollup index; $expr picks the category.
+                {"$match": {"user_id": user_id, "month": month, "$expr": {"$eq": ["$category", "$$category"]}}},
+                {"$project": {"_id": 0, "total": 1}}
+            ],
+            "as": "rollup"
+        }},
+        # Rounded so float residue from $inc deltas never tips a budget over.
+        {"$addFields": {"spent": {"$round": [{"$ifNull": [{"$arrayElemAt": ["$rollup.total", 0]}, 0]}, 2]}}},
+        {"$addFields": {
+            "remaining": {"$round": [{"$subtract": ["$amount", "$spent"]}, 2]},
+            "percent_used": {"$cond": [
+                {"$gt": ["$amount", 0]},
+                {"$round": [{"$multiply": [{"$divide": ["$spent", "$amount"]}, 100]}, 1]},
+                None
+            ]},
+            "over_budget": {"$gt": ["$spent", "$amount"]}
+        }},
+        {"$project": {"_id": 0, "rollup": 0}},
+        {"$sort": {"category": 1}}
+    ]
+    rows = await db.budgets.aggregate(pipeline).to_list(None)
+    return [parse_stored_dates(row, "created_at") for row in rows]
+
+@api_router.get("/budgets", response_model=List[Budget])
+async def get_budgets(request: Request, month: Optional[str] = None):
+    user_id = await get_current_user(request)
+    not_modified, cache_headers = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+    return ORJSONResponse(await list_budgets(user_id, month), headers=cache_headers)
+
+def budget_upsert(user_id: str, category: str, month: str, amount: float) -> Tuple[dict, dict]:
+    """Filter and update that set one budget, creating it if needed.
+
+    The filter matches the unique (user_id, category, month) index, so
+    concurrent upserts of the same budget resolve to a single document.
+    """
+    selector = {"user_id": user_id, "category": category, "month": month}
+    update = {
+        "$set": {"amount": amount},
+        "$setOnInsert": {
+            "budget_id": f"budget_{uuid.uuid4().hex[:12]}",
+            "created_at": datetime.now(timezone.utc)
+        }
+    }
+    return selector, update
+
+@api_router.get("/budgets/status", response_model=MonthBudgetStatus)
+async def get_budget_status(request: Request, month: str):
+    user_id = await get_current_user(request)
+    month_bounds(month)
+    not_modified, cache_headers = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+    
+    budgets = await budget_status(user_id, month)
+    total_budget = sum(budget["amount"] for budget in budgets)
+    total_spent = sum(budget["spent"] for budget in budgets)
+    return ORJSONResponse({
+        "month": month,
+        "budgets": budgets,
+        "total_budget": round(total_budget, 2),
+        "total_spent": round(total_spent, 2),
+        "total_remaining": round(total_budget - total_spent, 2),
+        "over_budget_count": sum(budget["over_budget"] for budget in budgets)
+    }, headers=cache_headers)
 
 @api_router.post("/budgets")
 async def create_budget(request: Request, budget_data: BudgetCreate):
     user_id = await get_current_user(request)
+    month_bounds(budget_data.month)
     
-    existing = await db.budgets.find_one({
-        "user_id": user_id,
-        "category": budget_data.category,
-        "month": budget_data.month
-    })
-    
-    if existing:
-        await db.budgets.update_one(
-            {"user_id": user_id, "category": budget_data.category, "month": budget_data.month},
-            {"$set": {"amount": budget_data.amount}}
+    selector, update = budget_upsert(user_id, budget_data.category, budget_data.month, budget_data.amount)
+    try:
+        budget = await db.budgets.find_one_and_update(
+            selector, update, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
         )
-        existing["amount"] = budget_data.amount
-        if isinstance(existing.get("created_at"), str):
-            existing["created_at"] = datetime.fromisoformat(existing["created_at"])
-        return Budget(**existing)
+    except DuplicateKeyError:
+        # A concurrent save of the same budget inserted it first.
+        budget = await db.budgets.find_one_and_update(
+            selector, {"$set": update["$set"]}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+    await bump_data_version(user_id)
     
-    budget_doc = {
-        "budget_id": f"budget_{uuid.uuid4().hex[:12]}",
-        "user_id": user_id,
-        "category": budget_data.category,
-        "amount": budget_data.amount,
-        "month": budget_data.month,
-        "created_at": datetime.now(timezone.utc).isoformat()
+    # Spend per budget comes from the rollups, so clients fetch the month's status.
+    await live_events.publish(user_id, ("budgets.changed", {"month": budget_data.month}))
+    return Budget(**parse_stored_dates(budget, "created_at"))
+
+@api_router.put("/budgets", response_model=List[Budget])
+async def set_month_budgets(request: Request, month_budgets: MonthBudgets):
+    """Replace a month's budgets: listed categories are set, the rest removed."""
+    user_id = await get_current_user(request)
+    month = month_budgets.month
+    month_bounds(month)
+    
+    # The last amount wins if a category is listed twice.
+    amounts = {budget.category: budget.amount for budget in month_budgets.budgets}
+    ops = [UpdateOne(*budget_upsert(user_id, category, month, amount), upsert=True)
+           for category, amount in amounts.items()]
+    ops.append(DeleteMany({"user_id": user_id, "month": month, "category": {"$nin": list(amounts)}}))
+    try:
+        await db.budgets.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        # Lost an upsert race to a concurrent save; the retry only updates.
+        await db.budgets.bulk_write(ops, ordered=False)
+    await bump_data_version(user_id)
+    
+    await live_events.publish(user_id, ("budgets.changed", {"month": month}))
+    return ORJSONResponse(await list_budgets(user_id, month))
+
+async def compute_monthly_stats(
+    user_id: str,
+    month: Optional[str] = None,
+    from_month: Optional[str] = None,
+    to_month: Optional[str] = None,
+    daily: bool = False
+) -> dict:
+    if month:
+        start, end = month_bounds(month)
+    elif from_month and to_month:
+        start, _ = month_bounds(from_month)
+        _, end = month_bounds(to_month)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    else:
+        raise HTTPException(status_code=400, detail="month or from/to required")
+    
+    first_month = start.strftime("%Y-%m")
+    last_month = (end - timedelta(days=1)).strftime("%Y-%m")
+    rollups = await read_rollups(db, user_id, first_month, last_month)
+    
+    by_category = {}
+    by_month = {}
+    for row in rollups:
+        by_category[row["category"]] = by_category.get(row["category"], 0) + row["total"]
+        month_totals = by_month.setdefault(row["month"], {"total": 0, "count": 0})
+        month_totals["total"] += row["total"]
+        month_totals["count"] += row["count"]
+    
+    # Rounded so float residue from $inc deltas never shows up in totals.
+    stats = {
+        "total": round(sum(row["total"] for row in rollups), 2),
+        "count": sum(row["count"] for row in rollups),
+        "by_category": {category: round(total, 2) for category, total in by_category.items()}
     }
+    if month:
+        stats = {"month": month, **stats}
+    else:
+        stats = {"from": from_month, "to": to_month, **stats}
+        stats["by_month"] = {
+            key: {"total": round(totals["total"], 2), "count": totals["count"]}
+            for key, totals in sorted(by_month.items())
+        }
     
-    await db.budgets.insert_one(budget_doc)
-    
-    if isinstance(budget_doc.get("created_at"), str):
-        budget_doc["created_at"] = datetime.fromisoformat(budget_doc["created_at"])
+    if daily:
+        # Rollups are monthly, so the per-day breakdown is aggregated from
+        # expenses; only one row per day leaves the database.
+        pipeline = [
+            {"$match": {"user_id": user_id, **date_range_filter(start, end)}},
+            {"$group": {
+                "_id": date_key_expr("%Y-%m-%d"),
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+        stats["by_day"] = {
+            row["_id"]: {"total": round(row["total"], 2), "count": row["count"]}
+            async for row in db.expenses.aggregate(pipeline)
+        }
     
-    return Budget(**budget_doc)
+    return stats
+
+async def cached_monthly_stats(
+    user_id: str,
+    month: Optional[str] = None,
+    from_month: Optional[str] = None,
+    to_month: Optional[str] = None,
+    daily: bool = False
+) -> dict:
+    return await cached_for_user(
+        user_id,
+        f"stats:{month}:{from_month}:{to_month}:{daily}",
+        lambda: compute_monthly_stats(user_id, month, from_month, to_month, daily)
+    )
 
 @api_router.get("/stats/monthly")
-async def get_monthly_stats(request: Request, month: str):
+async def get_monthly_stats(
+    request: Request,
+    month: Optional[str] = None,
+    from_month: Optional[str] = Query(None, alias="from"),
+    to_month: Optional[str] = Query(None, alias="to"),
+    daily: bool = False
+):
     user_id = await get_current_user(request)
-    
-    expenses = await db.expenses.find({
-        "user_id": user_id,
-        "date": {"$regex": f"^{month}"}
-    }, {"_id": 0}).to_list(1000)
-    
-    total = sum(exp["amount"] for exp in expenses)
-    
-    category_totals = {}
-    for exp in expenses:
-        cat = exp["category"]
-        if cat not in category_totals:
-            category_totals[cat] = 0
-        category_totals[cat] += exp["amount"]
-    
-    return {
-        "month": month,
-        "total": total,
-        "count": len(expenses),
-        "by_category": category_totals
-    }
+    not_modified, cache_headers = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+    stats = await cached_monthly_stats(user_id, month, from_month, to_month, daily)
+    return ORJSONResponse(stats, headers=cache_headers)
 
-@api_router.get("/export/csv")
-async def export_csv(request: Request, month: Optional[str] = None):
+async def compute_trends(user_id: str, to_month: str, months: int) -> dict:
+    first_month, fetch_month = analytics.month_range(to_month, months)
+    start, _ = month_bounds(first_month)
+    _, end = month_bounds(to_month)
+    
+    pipeline = [
+        {"$match": {"user_id": user_id, **date_range_filter(start, end)}},
+        {"$group": {
+            "_id": {"day": date_key_expr("%Y-%m-%d"), "category": "$category"},
+            "total": {"$sum": "$amount"}
+        }},
+        {"$project": {"_id": 0, "day": "$_id.day", "category": "$_id.category", "total": 1}}
+    ]
+    rollups, daily = await asyncio.gather(
+        read_rollups(db, user_id, fetch_month, to_month),
+        db.expenses.aggregate(pipeline).to_list(None)
+    )
+    today = datetime.now(timezone.utc).date()
+    # The pandas work is CPU-bound; keep it off the event loop.
+    return await asyncio.to_thread(analytics.spending_trends, rollups, daily, first_month, to_month, today)
+
+@api_router.get("/stats/trends")
+async def get_spending_trends(
+    request: Request,
+    to_month: Optional[str] = Query(None, alias="to"),
+    months: int = Query(12, ge=1, le=120)
+):
     user_id = await get_current_user(request)
+    to_month = to_month or datetime.now(timezone.utc).strftime("%Y-%m")
+    month_bounds(to_month)
+    await ensure_rollups(user_id)
+    # No ETag here: the projection moves with the calendar even when the
+    # data does not, so it is only cached for STATS_CACHE_TTL.
+    trends = await cached_for_user(
+        user_id,
+        f"trends:{to_month}:{months}",
+        lambda: compute_trends(user_id, to_month, months)
+    )
+    return ORJSONResponse(trends)
+
+@api_router.get("/dashboard", response_model=Dashboard)
+async def get_dashboard(request: Request, month: str):
+    user_id = await get_current_user(request)
+    # Reject a bad month before fanning out any queries.
+    month_bounds(month)
+    not_modified, cache_headers = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+    
+    user, expenses, categories, budgets, stats = await asyncio.gather(
+        load_user(user_id),
+        list_expenses(user_id, month),
+        cached_for_user(user_id, "categories", lambda: list_categories(user_id)),
+        budget_status(user_id, month),
+        cached_monthly_stats(user_id, month)
+    )
     
+    return ORJSONResponse({
+        "month": month,
+        "user": user.model_dump(),
+        "expenses": expenses,
+        "categories": categories,
+        "budgets": budgets,
+        "stats": stats
+    }, headers=cache_headers)
+
+def export_format(format: str) -> tuple:
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    stream, media_type, extension, needs_arrow = EXPORT_FORMATS[format]
+    if needs_arrow and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow")
+    return stream, media_type, extension
+
+def export_cursor(user_id: str, month: Optional[str] = None):
     query = {"user_id": user_id}
     if month:
-        query["date"] = {"$regex": f"^{month}"}
+        query.update(month_filter(month))
+    return db.expenses.find(query, EXPORT_FIELDS).sort(EXPENSE_SORT).batch_size(EXPORT_BATCH_SIZE)
+
+@api_router.get("/export")
+@api_router.get("/export/csv")
+async def export_expenses(request: Request, month: Optional[str] = None, format: str = "csv"):
+    user_id = await get_current_user(request)
+    stream, media_type, extension = export_format(format)
+    cursor = export_cursor(user_id, month)
     
-    expenses = await db.expenses.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
+    return StreamingResponse(
+        stream(cursor),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=expenses_{month or 'all'}.{extension}"}
+    )
+
+# Background jobs. Handlers must be safe to run again from the start: a job
+# interrupted by a deploy or a crash is picked up again by another worker.
+
+@job_runner.handler("export")
+async def run_export_job(job: JobContext) -> dict:
+    """Full-history (or one month) export, stored for download."""
+    month = job.params.get("month")
+    stream, media_type, extension = export_format(job.params["format"])
+    cursor = export_cursor(job.job["user_id"], month)
+    return await job.save_result_file(stream(cursor), f"expenses_{month or 'all'}.{extension}", media_type)
+
+@job_runner.handler("rebuild_rollups")
+async def run_rollup_rebuild_job(job: JobContext) -> dict:
+    user_id = job.job["user_id"]
+    report = await sync_rollups(db, user_id=user_id, repair=True, on_repair=bump_data_version)
+    if report["buckets_repaired"]:
+        await live_events.publish(user_id, (RESYNC, None))
+    return report
+
+@job_runner.handler("migrate_dates")
+async def run_date_migration_job(job: JobContext) -> dict:
+    user_id = job.job["user_id"]
+    summary = await migrate_dates(db, BULK_BATCH_SIZE, user_id=user_id, on_change=bump_data_version)
+    await live_events.publish(user_id, (RESYNC, None))
+    return summary
+
+def job_params(kind: str, params: dict) -> dict:
+    """Check a job's parameters up front, so bad ones fail the request rather than the job."""
+    if kind not in job_runner.handlers:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(job_runner.handlers)}")
+    if kind == "export":
+        format = params.get("format", "csv")
+        export_format(format)
+        month = params.get("month")
+        if month:
+            month_bounds(month)
+        return {"format": format, "month": month}
+    return {}
+
+async def get_user_job(user_id: str, job_id: str, internal: bool = False) -> dict:
+    job = await job_runner.get(user_id, job_id, internal=internal)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/jobs", response_model=Job, status_code=202)
+async def submit_job(request: Request, job_data: JobCreate):
+    user_id = await get_current_user(request)
+    params = job_params(job_data.kind, job_data.params)
+    if await job_runner.count_active(user_id) >= MAX_ACTIVE_JOBS:
+        raise HTTPException(status_code=429, detail=f"At most {MAX_ACTIVE_JOBS} jobs can be queued or running at once")
+    job = await job_runner.submit(user_id, job_data.kind, params)
+    return ORJSONResponse(job, status_code=202, headers={"Location": f"/api/jobs/{job['job_id']}"})
+
+@api_router.get("/jobs", response_model=List[Job])
+async def list_jobs(request: Request, limit: int = Query(50, ge=1, le=200)):
+    user_id = await get_current_user(request)
+    return ORJSONResponse(await job_runner.list_jobs(user_id, limit))
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(request: Request, job_id: str):
+    user_id = await get_current_user(request)
+    return ORJSONResponse(await get_user_job(user_id, job_id))
+
+@api_router.post("/jobs/{job_id}/cancel", response_model=Job)
+async def cancel_job(request: Request, job_id: str):
+    user_id = await get_current_user(request)
+    job = await job_runner.cancel(user_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ORJSONResponse(job)
+
+@api_router.get("/jobs/{job_id}/download")
+async def download_job_result(request: Request, job_id: str):
+    user_id = await get_current_user(request)
+    job = await get_user_job(user_id, job_id, internal=True)
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    try:
+        result_file = await job_runner.open_result(job)
+    except NoFile:
+        result_file = None
+    if result_file is None:
+        raise HTTPException(status_code=404, detail="Job has no file to download")
     
-    csv_content = "Date,Title,Category,Amount,Notes\n"
-    for exp in expenses:
-        date = exp["date"] if isinstance(exp["date"], str) else exp["date"].isoformat()
-        notes = exp.get("notes", "").replace(",", ";")
-        csv_content += f"{date},{exp['title']},{exp['category']},{exp['amount']},{notes}\n"
+    async def chunks():
+        while chunk := await result_file.readchunk():
+            yield chunk
     
     return StreamingResponse(
-        iter([csv_content]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=expenses_{month or 'all'}.csv"}
+        chunks(),
+        media_type=job["result"]["content_type"],
+        headers={
+            "Content-Disposition": f"attachment; filename={job['result']['filename']}",
+            "Content-Length": str(result_file.length)
+        }
+    )
+
+@api_router.get("/events")
+async def stream_events(request: Request):
+    """Server-Sent Events carrying the user's changes as they happen.
+
+    Event types: ready (first, with the delivery mode), expense.created,
+    expense.updated, expense.deleted, expenses.imported, stats.changed
+    (rollup deltas per month and category), category.created,
+    category.deleted, budgets.changed and resync.
+    """
+    user_id = await get_current_user(request)
+    return StreamingResponse(
+        live_events.stream(user_id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx-style proxies from holding events back.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @api_router.get("/health")
@@ -459,6 +1380,10 @@ async def health_check():
             "status": "healthy",
             "service": "expense-tracker-backend",
             "database": "connected",
+            "cache": cache.stats(),
+            "oauth_upstream": oauth_client.stats(),
+            "events": {"mode": live_events.mode, "streams": live_events.subscriber_count()},
+            "indexes": getattr(app.state, "index_status", "skipped"),
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
     except Exception as e:
@@ -470,6 +1395,27 @@ async def health_check():
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
+# When set, /metrics and /debug/* require "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+def check_metrics_token(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    check_metrics_token(request)
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/debug/slow-queries", include_in_schema=False)
+async def list_slow_queries(request: Request, limit: int = Query(20, ge=1, le=500)):
+    """Slowest query shapes seen by this worker, by total time spent."""
+    check_metrics_token(request)
+    if slow_queries is None:
+        raise HTTPException(status_code=404, detail="Slow-query profiling is off; set SLOW_QUERY_MS to enable it")
+    return {"threshold_ms": SLOW_QUERY_MS, "queries": slow_queries.top(limit)}
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -478,14 +1424,79 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Added last so it wraps CORS too and times the whole request.
+app.add_middleware(metrics.MetricsMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+async def build_indexes():
+    app.state.index_status = "building"
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        # Reported by /api/health too: a missing unique index lets duplicate
+        # budgets in. Fix the data (see manage.py) and restart.
+        logger.error(f"Index bootstrap failed: {e}")
+        app.state.index_status = f"failed: {e}"
+    else:
+        app.state.index_status = "ready"
+
+@app.on_event("startup")
+async def ensure_db_indexes():
+    # Building an index on a large collection can take longer than gunicorn
+    # waits for a worker to boot, so it runs in the background. Deploys that
+    # add indexes should run `python manage.py ensure-indexes` first.
+    app.state.index_status = "skipped"
+    app.state.index_build = asyncio.create_task(build_indexes()) if ENSURE_INDEXES_ON_STARTUP else None
+
+@app.on_event("startup")
+async def start_http_clients():
+    await oauth_client.start()
+
+@app.on_event("startup")
+async def start_slow_query_profiler():
+    if slow_queries:
+        await slow_queries.start(client)
+
+@app.on_event("startup")
+async def start_job_runner():
+    await job_runner.start(db)
+
+@app.on_event("startup")
+async def start_event_broker():
+    await live_events.start(db)
+
+@app.on_event("shutdown")
+async def stop_index_build():
+    if app.state.index_build is not None:
+        app.state.index_build.cancel()
+        await asyncio.gather(app.state.index_build, return_exceptions=True)
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    await job_runner.stop()
+
+@app.on_event("shutdown")
+async def stop_event_broker():
+    await live_events.stop()
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    await oauth_client.close()
+    await cache.close()
+
+@app.on_event("shutdown")
+async def stop_slow_query_profiler():
+    if slow_queries:
+        await slow_queries.stop()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -4,4 +4,6 @@
 set -o errexit  # Exit on error
 
 echo "Starting FastAPI server..."
-uvicorn server:app --host 0.0.0.0 --port ${PORT:-8001}
+# Worker count, timeouts and the bind port come from gunicorn.conf.py
+# (WEB_CONCURRENCY, GRACEFUL_TIMEOUT, PORT, ...).
+exec gunicorn server:app -c gunicorn.conf.py
@@ -0,0 +1,107 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+
+# Retried because they are transient; any other status is returned as-is.
+RETRY_STATUSES = {502, 503, 504}
+
+
+class UpstreamClient:
+    """App-lifetime HTTP client for one upstream service.
+
+    Keeps a pooled keep-alive ``httpx.AsyncClient`` between requests, applies
+    explicit timeouts, retries transport errors and 502/503/504 responses
+    with exponential backoff and full jitter, and records call latency.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_retries: int = 2,
+        backoff: float = 0.2,
+        latency_window: int = 1000
+    ):
+        self.name = name
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0
+        )
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying transient failures.
+
+        Raises the last ``httpx.TransportError`` once retries are exhausted.
+        """
+        if self._client is None:
+            await self.start()
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            self.requests += 1
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                self._latencies.append(time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+            else:
+                self._latencies.append(time.perf_counter() - started)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    if response.status_code >= 500:
+                        self.failures += 1
+                    return response
+                await response.aclose()
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 2) if latencies else None
+            }
+        }
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { format, startOfMonth, endOfMonth, subMonths } from 'date-fns';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 import { Button } from '@/components/ui/button';
@@ -11,6 +11,37 @@ import { Textarea } from '@/components/ui/textarea';
 import { toast } from 'sonner';
 import { useNavigate } from 'react-router-dom';
 
+// Apply stats.changed deltas (one per month and category) to a month's stats.
+const applyStatChanges = (stats, changes) => {
+  if (!stats) return stats;
+  const byCategory = { ...stats.by_category };
+  let { total, count } = stats;
+  for (const change of changes) {
+    total += change.total;
+    count += change.count;
+    const value = (byCategory[change.category] || 0) + change.total;
+    // Below half a paisa is float residue; the category has been emptied.
+    if (Math.abs(value) < 0.005) {
+      delete byCategory[change.category];
+    } else {
+      byCategory[change.category] = value;
+    }
+  }
+  return { ...stats, total, count, by_category: byCategory };
+};
+
+// Same arithmetic as the server's budget status.
+const applyBudgetSpend = (budget, spentDelta) => {
+  const spent = Math.round((budget.spent + spentDelta) * 100) / 100;
+  return {
+    ...budget,
+    spent,
+    remaining: Math.round((budget.amount - spent) * 100) / 100,
+    percent_used: budget.amount > 0 ? Math.round((spent / budget.amount) * 1000) / 10 : null,
+    over_budget: spent > budget.amount
+  };
+};
+
 const Dashboard = () => {
   const navigate = useNavigate();
   const [user, setUser] = useState(null);
@@ -24,6 +55,11 @@ const Dashboard = () => {
   const [showBudgetSettings, setShowBudgetSettings] = useState(false);
   const [editingExpense, setEditingExpense] = useState(null);
   const [loading, setLoading] = useState(true);
+  // True while the live event stream is open and fed by change streams.
+  // Changes, including our own, then arrive through it, so mutations skip
+  // the full reload. In memory mode our own changes only reach us if the
+  // write happened to land on the worker holding the stream.
+  const live = useRef(false);
 
   const [expenseForm, setExpenseForm] = useState({
     title: '',
@@ -44,81 +80,101 @@ const Dashboard = () => {
   });
 
   useEffect(() => {
-    fetchUser();
-    fetchCategories();
-  }, []);
+    fetchDashboard();
+  }, [selectedMonth]);
 
   useEffect(() => {
-    if (categories.length > 0) {
-      fetchExpenses();
-      fetchBudgets();
-      fetchStats();
-    }
-  }, [selectedMonth, categories]);
-
-  const fetchUser = async () => {
-    try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/auth/me`, {
-        credentials: 'include'
-      });
-      const data = await response.json();
-      setUser(data);
-    } catch (error) {
-      console.error('Failed to fetch user:', error);
-    }
-  };
-
-  const fetchExpenses = async () => {
+    const source = new EventSource(`${process.env.REACT_APP_BACKEND_URL}/api/events`, {
+      withCredentials: true
+    });
+    let reconnecting = false;
+    const on = (type, handler) =>
+      source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+    const inMonth = (month) => month === selectedMonth;
+
+    source.onopen = () => {
+      // Anything that changed while we were disconnected was missed.
+      if (reconnecting) fetchDashboard();
+    };
+    on('ready', ({ mode }) => {
+      live.current = mode === 'changestream';
+    });
+    source.onerror = () => {
+      live.current = false;
+      reconnecting = true;
+    };
+
+    const upsertExpense = ({ expense }) => setExpenses(current => {
+      const rest = current.filter(e => e.expense_id !== expense.expense_id);
+      if (!inMonth(expense.date.slice(0, 7))) return rest;
+      return [...rest, expense].sort(
+        (a, b) => b.date.localeCompare(a.date) || b.expense_id.localeCompare(a.expense_id)
+      );
+    });
+    on('expense.created', upsertExpense);
+    on('expense.updated', upsertExpense);
+    on('expense.deleted', ({ expense_id }) =>
+      setExpenses(current => current.filter(e => e.expense_id !== expense_id)));
+    on('stats.changed', ({ changes }) => {
+      const changed = changes.filter(change => inMonth(change.month));
+      if (changed.length === 0) return;
+      setStats(current => applyStatChanges(current, changed));
+      setBudgets(current => current.map(budget => {
+        const spentDelta = changed
+          .filter(change => change.category === budget.category)
+          .reduce((sum, change) => sum + change.total, 0);
+        return spentDelta ? applyBudgetSpend(budget, spentDelta) : budget;
+      }));
+    });
+    on('expenses.imported', ({ months }) => {
+      if (months.some(inMonth)) fetchDashboard();
+    });
+    on('category.created', ({ category }) => setCategories(current =>
+      current.some(c => c.category_id === category.category_id) ? current : [...current, category]));
+    on('category.deleted', ({ category_id }) =>
+      setCategories(current => current.filter(c => c.category_id !== category_id)));
+    on('budgets.changed', ({ month }) => {
+      if (inMonth(month)) fetchBudgetStatus();
+    });
+    on('resync', () => fetchDashboard());
+
+    return () => {
+      live.current = false;
+      source.close();
+    };
+  }, [selectedMonth]);
+
+  const fetchDashboard = async () => {
     try {
       setLoading(true);
       const response = await fetch(
-        `${process.env.REACT_APP_BACKEND_URL}/api/expenses?month=${selectedMonth}`,
+        `${process.env.REACT_APP_BACKEND_URL}/api/dashboard?month=${selectedMonth}`,
         { credentials: 'include' }
       );
       const data = await response.json();
-      setExpenses(data);
+      setUser(data.user);
+      setExpenses(data.expenses);
+      setCategories(data.categories);
+      setBudgets(data.budgets);
+      setStats(data.stats);
     } catch (error) {
-      console.error('Failed to fetch expenses:', error);
+      console.error('Failed to fetch dashboard:', error);
       toast.error('Failed to load expenses');
     } finally {
       setLoading(false);
     }
   };
 
-  const fetchCategories = async () => {
-    try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/categories`, {
-        credentials: 'include'
-      });
-      const data = await response.json();
-      setCategories(data);
-    } catch (error) {
-      console.error('Failed to fetch categories:', error);
-    }
-  };
-
-  const fetchBudgets = async () => {
-    try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/budgets`, {
-        credentials: 'include'
-      });
-      const data = await response.json();
-      setBudgets(data.filter(b => b.month === selectedMonth));
-    } catch (error) {
-      console.error('Failed to fetch budgets:', error);
-    }
-  };
-
-  const fetchStats = async () => {
+  const fetchBudgetStatus = async () => {
     try {
       const response = await fetch(
-        `${process.env.REACT_APP_BACKEND_URL}/api/stats/monthly?month=${selectedMonth}`,
+        `${process.env.REACT_APP_BACKEND_URL}/api/budgets/status?month=${selectedMonth}`,
         { credentials: 'include' }
       );
       const data = await response.json();
-      setStats(data);
+      setBudgets(data.budgets);
     } catch (error) {
-      console.error('Failed to fetch stats:', error);
+      console.error('Failed to fetch budgets:', error);
     }
   };
 
@@ -151,8 +207,7 @@ const Dashboard = () => {
           date: format(new Date(), 'yyyy-MM-dd'),
           notes: ''
         });
-        fetchExpenses();
-        fetchStats();
+        if (!live.current) fetchDashboard();
       } else {
         toast.error('Failed to save expense');
       }
@@ -176,8 +231,7 @@ const Dashboard = () => {
 
       if (response.ok) {
         toast.success('Expense deleted');
-        fetchExpenses();
-        fetchStats();
+        if (!live.current) fetchDashboard();
       } else {
         toast.error('Failed to delete expense');
       }
@@ -201,7 +255,7 @@ const Dashboard = () => {
         toast.success('Category added');
         setShowAddCategory(false);
         setCategoryForm({ name: '', color: '#E15554' });
-        fetchCategories();
+        if (!live.current) fetchDashboard();
       } else {
         toast.error('Failed to add category');
       }
@@ -228,7 +282,7 @@ const Dashboard = () => {
       if (response.ok) {
         toast.success('Budget set');
         setBudgetForm({ category: '', amount: '' });
-        fetchBudgets();
+        if (!live.current) fetchDashboard();
       } else {
         toast.error('Failed to set budget');
       }
@@ -283,11 +337,10 @@ const Dashboard = () => {
       }))
     : [];
 
-  const budgetAlerts = budgets.map(budget => {
-    const spent = stats?.by_category?.[budget.category] || 0;
-    const percentage = (spent / budget.amount) * 100;
-    return { ...budget, spent, percentage };
-  }).filter(b => b.percentage > 0);
+  // Spend, percent used and over-budget come joined from the server.
+  const budgetAlerts = budgets
+    .filter(budget => budget.spent > 0)
+    .map(budget => ({ ...budget, percentage: budget.percent_used ?? 100 }));
 
   if (loading && expenses.length === 0) {
     return (
@@ -528,7 +581,7 @@ const Dashboard = () => {
                     <div className="flex items-center justify-between mb-2">
                       <span className="font-medium text-stone-900">{budget.category}</span>
                       <span className={`text-sm font-semibold ${
-                        budget.percentage > 100 ? 'text-red-600' :
+                        budget.over_budget ? 'text-red-600' :
                         budget.percentage > 80 ? 'text-orange-600' :
                         'text-green-600'
                       }`}>
@@ -538,7 +591,7 @@ const Dashboard = () => {
                     <div className="w-full bg-stone-200 rounded-full h-2 mb-2">
                       <div
                         className={`h-2 rounded-full transition-all ${
-                          budget.percentage > 100 ? 'bg-red-600' :
+                          budget.over_budget ? 'bg-red-600' :
                           budget.percentage > 80 ? 'bg-orange-600' :
                           'bg-green-600'
                         }`}
@@ -0,0 +1,73 @@
+from datetime import date
+
+from analytics import month_range, spending_trends
+
+ROLLUPS = [
+    {"month": "2025-10", "category": "Food", "total": 30.0},
+    {"month": "2025-10", "category": "Gifts", "total": 10.0},
+    {"month": "2025-11", "category": "Food", "total": 60.0},
+    {"month": "2025-12", "category": "Food", "total": 90.0},
+    # No Food in January: the gap must be a zero month, not a missing one.
+    {"month": "2026-01", "category": "Bills", "total": 100.0},
+    {"month": "2026-02", "category": "Food", "total": 50.0},
+    {"month": "2026-02", "category": "Bills", "total": 100.0},
+    {"month": "2026-03", "category": "Food", "total": 50.0},
+    {"month": "2026-03", "category": "Bills", "total": 120.0},
+    {"month": "2026-04", "category": "Food", "total": 25.0},
+]
+
+
+def trends(today=date(2026, 4, 10), rollups=ROLLUPS):
+    return spending_trends(rollups, [], "2026-01", "2026-04", today)
+
+
+def test_month_range_fetches_a_year_of_lookback():
+    assert month_range("2026-04", 4) == ("2026-01", "2025-02")
+
+
+def test_delta_and_percentage_change():
+    result = trends()
+    assert result["months"] == ["2026-01", "2026-02", "2026-03", "2026-04"]
+
+    food = result["by_category"]["Food"]
+    assert food["values"] == [0.0, 50.0, 50.0, 25.0]
+    assert food["delta"] == [-90.0, 50.0, 0.0, -25.0]
+    # Up from zero is not a percentage.
+    assert food["delta_pct"] == [-100.0, None, 0.0, -50.0]
+
+    bills = result["by_category"]["Bills"]
+    assert bills["delta"] == [100.0, 0.0, 20.0, -120.0]
+    assert bills["delta_pct"] == [None, 0.0, 20.0, -100.0]
+
+    # Zero to zero is not a percentage either.
+    assert result["by_category"]["Gifts"]["delta_pct"] == [None, None, None, None]
+
+    total = result["total"]
+    assert total["values"] == [100.0, 150.0, 170.0, 25.0]
+    assert total["delta_pct"] == [11.11, 50.0, 13.33, -85.29]
+
+
+def test_rolling_averages_use_months_before_the_window():
+    food = trends()["by_category"]["Food"]
+    assert food["rolling_3"] == [50.0, 46.67, 33.33, 41.67]
+    # Twelve months back from January reaches 2025-02; months without rollups count as zero.
+    assert food["rolling_12"][0] == 15.0
+    assert food["rolling_12"][-1] == 25.42
+    assert trends()["total"]["rolling_3"][0] == 83.33
+
+
+def test_projection_only_for_the_current_month():
+    projection = trends()["projection"]
+    # Jan-Mar spend at Food 100 and Bills 320 over 90 days, for the 20 days left.
+    assert projection["by_category"]["Food"] == {"spent_to_date": 25.0, "projected": 47.22}
+    assert projection["by_category"]["Bills"] == {"spent_to_date": 0.0, "projected": 71.11}
+    assert projection["projected_total"] == 118.33
+
+    assert trends(today=date(2026, 5, 2))["projection"] is None
+
+
+def test_no_history():
+    result = trends(rollups=[])
+    assert result["by_category"] == {}
+    assert result["total"]["values"] == [0.0, 0.0, 0.0, 0.0]
+    assert result["total"]["delta_pct"] == [None, None, None, None]
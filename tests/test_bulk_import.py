@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+from bulk_import import parse_csv, parse_json_array, parse_ndjson
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def parse(parser, data: bytes, size: int) -> list:
+    async def run():
+        return [row async for row in parser(chunked(data, size))]
+    return asyncio.run(run())
+
+
+CSV = (
+    "\ufeffDate,Title,Category,Amount,Notes\r\n"
+    "2026-01-02,Coffee,Food,3.50,\r\n"
+    '2026-01-03,"Dinner, with ""friends""",Food,42,"line one\nline two"\r\n'
+    "\r\n"
+    "2026-01-04,Café au lait,Food,4.2,€ receipt\n"
+).encode()
+
+CSV_ROWS = [
+    (1, {"date": "2026-01-02", "title": "Coffee", "category": "Food", "amount": "3.50", "notes": None}),
+    (2, {"date": "2026-01-03", "title": 'Dinner, with "friends"', "category": "Food", "amount": "42",
+         "notes": "line one\nline two"}),
+    (3, {"date": "2026-01-04", "title": "Café au lait", "category": "Food", "amount": "4.2", "notes": "€ receipt"}),
+]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(CSV)])
+def test_csv_across_chunk_boundaries(size):
+    # Size 1 and 2 split the BOM, the multi-byte characters, quoted commas
+    # and the newline inside a quoted field.
+    assert parse(parse_csv, CSV, size) == CSV_ROWS
+
+
+def test_csv_without_trailing_newline_and_unknown_columns():
+    data = b"title,amount,date,category,extra\nTea,2,2026-01-05,Food,ignored"
+    assert parse(parse_csv, data, 4) == [
+        (1, {"title": "Tea", "amount": "2", "date": "2026-01-05", "category": "Food", "notes": None}),
+    ]
+
+
+NDJSON_LINES = [
+    {"title": "Coffee", "amount": 3.5, "category": "Food", "date": "2026-01-02"},
+    {"title": "Café", "amount": 4, "category": "Food", "date": "2026-01-03", "notes": "€"},
+]
+NDJSON = (
+    "\n".join(json.dumps(line, ensure_ascii=False) for line in NDJSON_LINES)
+    + "\n\n[1, 2]\n{broken\n"
+    + json.dumps({"title": "Last", "amount": 1, "category": "Food", "date": "2026-01-04"})
+).encode()
+
+
+@pytest.mark.parametrize("size", [1, 5, 13, len(NDJSON)])
+def test_ndjson_across_chunk_boundaries(size):
+    rows = parse(parse_ndjson, NDJSON, size)
+    assert [number for number, _ in rows] == [1, 2, 3, 4, 5]
+    assert [fields for _, fields in rows[:2]] == NDJSON_LINES
+    assert isinstance(rows[2][1], ValueError)
+    assert isinstance(rows[3][1], ValueError)
+    assert rows[4][1]["title"] == "Last"
+
+
+@pytest.mark.parametrize("size", [1, 9])
+def test_json_array(size):
+    data = json.dumps(NDJSON_LINES + ["nope"], ensure_ascii=False).encode()
+    rows = parse(parse_json_array, data, size)
+    assert rows[:2] == [(1, NDJSON_LINES[0]), (2, NDJSON_LINES[1])]
+    assert rows[2][0] == 3 and isinstance(rows[2][1], ValueError)
+
+
+def test_json_body_must_be_an_array():
+    with pytest.raises(ValueError):
+        parse(parse_json_array, b'{"title": "x"}', 4)
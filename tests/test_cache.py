@@ -0,0 +1,153 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+import cache as cache_module
+from cache import Cache, MemoryBackend, cache_from_url
+
+
+@pytest.fixture
+def redis_workers(monkeypatch):
+    """Factory for Redis-backed caches that all share one fake server, like separate workers."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        cache_module.redis_asyncio.Redis, "from_url", lambda url: fakeredis.FakeAsyncRedis(server=server)
+    )
+    return lambda: cache_from_url("redis://cache:6379/0")
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_cache(request):
+    if request.param == "memory":
+        return lambda: Cache(MemoryBackend())
+    return request.getfixturevalue("redis_workers")
+
+
+def test_get_or_load_caches_value(make_cache):
+    async def run():
+        cache = make_cache()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            return {"total": 5}
+
+        assert await cache.get_or_load("u1", "stats", loader, 60) == {"total": 5}
+        assert await cache.get_or_load("u1", "stats", loader, 60) == {"total": 5}
+        assert len(calls) == 1
+        assert cache.stats()["hits"] == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_misses_share_one_load(make_cache):
+    async def run():
+        cache = make_cache()
+        calls = []
+        release = asyncio.Event()
+
+        async def loader():
+            calls.append(1)
+            await release.wait()
+            return [1, 2, 3]
+
+        waiters = [asyncio.create_task(cache.get_or_load("u1", "categories", loader, 60)) for _ in range(10)]
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await asyncio.gather(*waiters) == [[1, 2, 3]] * 10
+        assert len(calls) == 1
+
+    asyncio.run(run())
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached(make_cache):
+    async def run():
+        cache = make_cache()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("db down")
+
+        waiters = [asyncio.create_task(cache.get_or_load("u1", "stats", failing, 60)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        async def loader():
+            return {"total": 1}
+
+        assert await cache.get_or_load("u1", "stats", loader, 60) == {"total": 1}
+
+    asyncio.run(run())
+
+
+def test_invalidate_user_orphans_only_that_users_entries(make_cache):
+    async def run():
+        cache = make_cache()
+        version = {"u1": 1, "u2": 1}
+
+        def loader(user_id):
+            async def load():
+                return version[user_id]
+            return load
+
+        for user_id in version:
+            await cache.get_or_load(user_id, "stats", loader(user_id), 60)
+        version["u1"] = version["u2"] = 2
+        await cache.invalidate_user("u1")
+
+        assert await cache.get_or_load("u1", "stats", loader("u1"), 60) == 2
+        assert await cache.get_or_load("u2", "stats", loader("u2"), 60) == 1
+
+    asyncio.run(run())
+
+
+def test_redis_invalidation_reaches_other_workers(redis_workers):
+    async def run():
+        worker_a, worker_b = redis_workers(), redis_workers()
+        value = {"v": 1}
+
+        async def loader():
+            return dict(value)
+
+        assert await worker_a.get_or_load("u1", "stats", loader, 60) == {"v": 1}
+        # Worker B is served A's entry without loading it again.
+        assert await worker_b.get_or_load("u1", "stats", loader, 60) == {"v": 1}
+        assert worker_b.loads == 0
+
+        value["v"] = 2
+        await worker_a.invalidate_user("u1")
+        assert await worker_b.get_or_load("u1", "stats", loader, 60) == {"v": 2}
+
+    asyncio.run(run())
+
+
+def test_redis_lock_makes_other_workers_wait_for_the_load(redis_workers):
+    async def run():
+        worker_a, worker_b = redis_workers(), redis_workers()
+        calls = []
+        release = asyncio.Event()
+
+        async def loader():
+            calls.append(1)
+            await release.wait()
+            return {"total": 9}
+
+        first = asyncio.create_task(worker_a.get_or_load("u1", "stats", loader, 60))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(worker_b.get_or_load("u1", "stats", loader, 60))
+        await asyncio.sleep(0.05)
+        release.set()
+        assert await asyncio.gather(first, second) == [{"total": 9}, {"total": 9}]
+        assert len(calls) == 1
+
+    asyncio.run(run())
+
+
+def test_only_redis_is_shared(redis_workers):
+    assert not cache_from_url(None).shared
+    assert not cache_from_url("memory://").shared
+    assert redis_workers().shared
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from cache import cache_from_url
+
+
+@pytest.fixture
+def client(monkeypatch):
+    db = AsyncMongoMockClient()["etags_test"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "cache", cache_from_url(None))
+
+    async def seed():
+        now = datetime.now(timezone.utc)
+        await db.users.insert_one({
+            "user_id": "u1", "email": "ann@example.com", "name": "Ann", "created_at": now,
+            "categories_provisioned": True, "rollups_ready": True
+        })
+        await db.user_sessions.insert_one(
+            {"user_id": "u1", "session_token": "tok", "expires_at": now + timedelta(days=1), "created_at": now}
+        )
+
+    asyncio.run(seed())
+    # Not used as a context manager: the startup hooks would start the job
+    # runner and event broker, which these requests do not need.
+    return TestClient(server.app, headers={"Authorization": "Bearer tok"})
+
+
+def test_matching_etag_is_not_modified(client):
+    first = client.get("/api/categories")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = client.get("/api/categories", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+
+    # The ETag covers the path and query string.
+    assert client.get("/api/categories?page=2", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_write_makes_etag_stale(client):
+    etag = client.get("/api/categories").headers["ETag"]
+    assert client.post("/api/categories", json={"name": "Pets", "color": "#123456"}).status_code == 200
+
+    fresh = client.get("/api/categories", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+    assert "Pets" in [category["name"] for category in fresh.json()]
+
+
+@pytest.mark.parametrize("if_none_match", ['W/{etag}', '"other", {etag}', "*"])
+def test_weak_listed_and_wildcard_etags_match(client, if_none_match):
+    etag = client.get("/api/categories").headers["ETag"]
+    response = client.get("/api/categories", headers={"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+
+
+def test_unknown_etag_is_a_full_response(client):
+    assert client.get("/api/categories", headers={"If-None-Match": '"nope"'}).status_code == 200
+
+
+def test_login_makes_etag_stale(client, monkeypatch):
+    class SessionResponse:
+        status_code = 200
+
+        def json(self):
+            return {"name": "Ann B.", "email": "ann@example.com", "session_token": "tok2"}
+
+    async def exchange(*args, **kwargs):
+        return SessionResponse()
+
+    monkeypatch.setattr(server.oauth_client, "get", exchange)
+    etag = client.get("/api/categories").headers["ETag"]
+    assert client.post("/api/auth/session", json={"session_id": "s1"}).status_code == 200
+    assert client.get("/api/categories", headers={"If-None-Match": etag}).status_code == 200
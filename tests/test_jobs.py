@@ -0,0 +1,179 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient, enabled_gridfs_integration
+
+import jobs
+from jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobRunner
+
+
+@pytest.fixture
+def db():
+    with enabled_gridfs_integration():
+        yield AsyncMongoMockClient()["jobs_test"]
+
+
+def make_runner(**kwargs) -> JobRunner:
+    runner = JobRunner(**{"concurrency": 1, "lease_seconds": 30, "poll_interval": 0.01, **kwargs})
+
+    @runner.handler("sleep")
+    async def sleep(job):
+        await asyncio.sleep(job.params.get("seconds", 3600))
+        return {"slept": True}
+
+    return runner
+
+
+def attach(runner: JobRunner, db) -> JobRunner:
+    """Point a runner at ``db`` without starting its slots, so tests drive claims themselves."""
+    runner.db = db
+    runner._wakeup = asyncio.Event()
+    return runner
+
+
+async def stored(db, job_id: str) -> dict:
+    return await db.jobs.find_one({"job_id": job_id})
+
+
+async def wait_for_status(db, job_id: str, status: str) -> dict:
+    for _ in range(200):
+        doc = await stored(db, job_id)
+        if doc["status"] == status:
+            return doc
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {doc['status']}, never became {status}")
+
+
+def test_two_runners_never_claim_the_same_job(db):
+    async def run():
+        worker_a, worker_b = attach(make_runner(), db), attach(make_runner(), db)
+        job = await worker_a.submit("u1", "sleep", {})
+
+        claims = await asyncio.gather(worker_a._claim(), worker_b._claim())
+        winners = [claim for claim in claims if claim is not None]
+        assert len(winners) == 1
+        doc = await stored(db, job["job_id"])
+        assert doc["status"] == RUNNING
+        assert doc["attempts"] == 1
+        assert doc["worker"] == winners[0]["worker"]
+
+    asyncio.run(run())
+
+
+def test_live_lease_is_not_reclaimed_but_expired_one_is(db):
+    async def run():
+        worker_a = attach(make_runner(lease_seconds=30), db)
+        worker_b = attach(make_runner(), db)
+        job = await worker_a.submit("u1", "sleep", {})
+        assert (await worker_a._claim())["worker"] == worker_a.worker_id
+        assert await worker_b._claim() is None
+
+        # Worker A died: its lease runs out without being renewed.
+        await db.jobs.update_one(
+            {"job_id": job["job_id"]}, {"$set": {"lease_expires_at": jobs._now() - timedelta(seconds=1)}}
+        )
+        reclaimed = await worker_b._claim()
+        assert reclaimed["worker"] == worker_b.worker_id
+        assert reclaimed["attempts"] == 2
+
+        # If A comes back, nothing it records overwrites B's attempt.
+        await worker_a._finish(reclaimed, SUCCEEDED, result={"stale": True})
+        doc = await stored(db, job["job_id"])
+        assert (doc["status"], doc["worker"], doc["result"]) == (RUNNING, worker_b.worker_id, None)
+
+    asyncio.run(run())
+
+
+def test_job_fails_after_max_attempts(db):
+    async def run():
+        runner = attach(make_runner(max_attempts=2), db)
+        job = await runner.submit("u1", "sleep", {})
+        for _ in range(2):
+            assert await runner._claim() is not None
+            await db.jobs.update_one(
+                {"job_id": job["job_id"]}, {"$set": {"lease_expires_at": jobs._now() - timedelta(seconds=1)}}
+            )
+        assert await runner._claim() is None
+        doc = await stored(db, job["job_id"])
+        assert doc["status"] == FAILED
+        assert doc["error"] == "Gave up after 2 attempts"
+
+    asyncio.run(run())
+
+
+def test_cancel_queued_job(db):
+    async def run():
+        runner = attach(make_runner(), db)
+        job = await runner.submit("u1", "sleep", {})
+        cancelled = await runner.cancel("u1", job["job_id"])
+        assert cancelled["status"] == CANCELLED
+        assert "worker" not in cancelled
+        assert await runner._claim() is None
+        # Another user cannot see or cancel it.
+        assert await runner.cancel("u2", job["job_id"]) is None
+
+    asyncio.run(run())
+
+
+def test_cancel_running_job_on_this_worker(db):
+    async def run():
+        runner = make_runner()
+        await runner.start(db)
+        try:
+            job = await runner.submit("u1", "sleep", {})
+            await wait_for_status(db, job["job_id"], RUNNING)
+            await runner.cancel("u1", job["job_id"])
+            await wait_for_status(db, job["job_id"], CANCELLED)
+        finally:
+            await runner.stop()
+
+    asyncio.run(run())
+
+
+def test_cancel_requested_elsewhere_stops_job_at_lease_renewal(db):
+    async def run():
+        runner = make_runner(lease_seconds=0.06)
+        await runner.start(db)
+        try:
+            job = await runner.submit("u1", "sleep", {})
+            await wait_for_status(db, job["job_id"], RUNNING)
+            # What cancel() does when the job runs on another worker.
+            await db.jobs.update_one({"job_id": job["job_id"]}, {"$set": {"cancel_requested": True}})
+            await wait_for_status(db, job["job_id"], CANCELLED)
+        finally:
+            await runner.stop()
+
+    asyncio.run(run())
+
+
+def test_stop_hands_running_job_back_to_the_queue(db):
+    async def run():
+        runner = make_runner()
+        await runner.start(db)
+        job = await runner.submit("u1", "sleep", {})
+        await wait_for_status(db, job["job_id"], RUNNING)
+        await runner.stop()
+
+        doc = await stored(db, job["job_id"])
+        assert doc["status"] == QUEUED
+        assert doc["attempts"] == 0
+        assert "worker" not in doc
+
+    asyncio.run(run())
+
+
+def test_finished_job_records_result(db):
+    async def run():
+        runner = make_runner()
+        await runner.start(db)
+        try:
+            job = await runner.submit("u1", "sleep", {"seconds": 0})
+            await wait_for_status(db, job["job_id"], SUCCEEDED)
+            doc = await runner.get("u1", job["job_id"])
+            assert doc["result"] == {"slept": True}
+            assert doc["expires_at"] > doc["finished_at"]
+        finally:
+            await runner.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,83 @@
+import json
+import re
+from datetime import datetime
+
+from bson.regex import Regex
+
+from profiler import _find_key, normalize, query_shape, summarize_plan
+
+COLLSCAN = {"stage": "COLLSCAN", "filter": {"notes": {"$eq": "x"}}, "direction": "forward"}
+
+# A sort over a fetched index range, as explain reports it for the expenses list.
+NESTED = {
+    "stage": "SORT",
+    "inputStage": {
+        "stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1_date_-1", "keyPattern": {"user_id": 1, "date": -1}},
+    },
+}
+
+
+def test_normalize_replaces_literals_only():
+    query = {
+        "user_id": "user_abc",
+        "date": {"$gte": datetime(2026, 1, 1), "$lt": datetime(2026, 2, 1)},
+        "category": {"$in": ["Food", "Bills"]},
+        "amount": 12.5,
+        "deleted": None,
+    }
+    assert normalize(query) == {
+        "user_id": "?",
+        "date": {"$gte": "?", "$lt": "?"},
+        "category": {"$in": "?"},
+        "amount": "?",
+        "deleted": "?",
+    }
+
+
+def test_normalize_keeps_field_paths_sorts_and_hides_patterns():
+    pipeline = [
+        {"$match": {"$or": [{"title": Regex("^cof", "i")}, {"notes": re.compile("bean")}]}},
+        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+        {"$sort": {"total": -1}},
+    ]
+    assert normalize(pipeline) == [
+        {"$match": {"$or": [{"title": "/?/"}, {"notes": "/?/"}]}},
+        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}, "count": {"$sum": "?"}}},
+        {"$sort": {"total": -1}},
+    ]
+
+
+def test_queries_differing_only_in_values_share_a_shape():
+    def find(user_id, month_start):
+        return {
+            "find": "expenses", "filter": {"user_id": user_id, "date": {"$gte": month_start}},
+            "sort": {"date": -1}, "limit": 50, "lsid": {"id": user_id}, "$db": "expense_tracker",
+        }
+
+    shape = query_shape("find", find("u1", datetime(2026, 1, 1)))
+    assert shape == query_shape("find", find("u2", datetime(2025, 6, 1)))
+    assert json.loads(shape) == {
+        "collection": "expenses", "op": "find",
+        "filter": {"user_id": "?", "date": {"$gte": "?"}}, "sort": {"date": -1},
+    }
+
+
+def test_summarize_collscan():
+    assert summarize_plan(COLLSCAN) == "COLLSCAN"
+    assert summarize_plan(None) is None
+
+
+def test_summarize_nested_ixscan_fetch():
+    assert summarize_plan(NESTED) == "SORT > FETCH > IXSCAN(user_id_1_date_-1)"
+    # Slot-based execution wraps the classic plan in queryPlan.
+    assert summarize_plan({"queryPlan": NESTED["inputStage"], "slotBasedPlan": {}}) == "FETCH > IXSCAN(user_id_1_date_-1)"
+    # An $or is summarized along its first branch.
+    assert summarize_plan({"stage": "OR", "inputStages": [NESTED["inputStage"]["inputStage"], COLLSCAN]}) == (
+        "OR > IXSCAN(user_id_1_date_-1)"
+    )
+
+
+def test_winning_plan_is_found_in_aggregate_explain():
+    explain = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": NESTED}}}, {"$group": {}}]}
+    assert summarize_plan(_find_key(explain, "winningPlan")) == "SORT > FETCH > IXSCAN(user_id_1_date_-1)"
@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import rollups
+from rollups import rollup_deltas
+
+
+def expense(amount, date, category="Food", user_id="u1"):
+    return {"user_id": user_id, "amount": amount, "date": date, "category": category}
+
+
+def test_create_and_delete():
+    assert rollup_deltas([], [expense(12.5, datetime(2026, 3, 4))]) == {("u1", "2026-03", "Food"): [12.5, 1]}
+    assert rollup_deltas([expense(12.5, datetime(2026, 3, 4))], []) == {("u1", "2026-03", "Food"): [-12.5, -1]}
+
+
+def test_amount_change_in_same_bucket_keeps_count():
+    old = expense(10.0, datetime(2026, 3, 4))
+    new = expense(14.0, datetime(2026, 3, 20))
+    assert rollup_deltas([old], [new]) == {("u1", "2026-03", "Food"): [4.0, 0]}
+
+
+def test_move_across_months():
+    old = expense(10.0, datetime(2026, 1, 31))
+    new = expense(10.0, datetime(2026, 2, 1))
+    assert rollup_deltas([old], [new]) == {
+        ("u1", "2026-01", "Food"): [-10.0, -1],
+        ("u1", "2026-02", "Food"): [10.0, 1],
+    }
+
+
+def test_move_across_categories_and_months():
+    old = expense(10.0, datetime(2025, 12, 31), category="Food")
+    new = expense(25.0, datetime(2026, 1, 1), category="Bills")
+    assert rollup_deltas([old], [new]) == {
+        ("u1", "2025-12", "Food"): [-10.0, -1],
+        ("u1", "2026-01", "Bills"): [25.0, 1],
+    }
+
+
+def test_unchanged_bucket_is_dropped():
+    same = expense(10.0, datetime(2026, 3, 4))
+    assert rollup_deltas([same], [dict(same)]) == {}
+
+
+def test_legacy_string_dates_use_their_month_prefix():
+    old = expense(5.0, "2026-03-31T23:00:00")
+    new = expense(5.0, datetime(2026, 4, 1))
+    assert rollup_deltas([old], [new]) == {
+        ("u1", "2026-03", "Food"): [-5.0, -1],
+        ("u1", "2026-04", "Food"): [5.0, 1],
+    }
+
+
+def test_batch_nets_updates_per_bucket():
+    removed = [expense(3.0, datetime(2026, 3, 1)), expense(4.0, datetime(2026, 3, 2), category="Bills")]
+    added = [
+        expense(3.0, datetime(2026, 3, 1), category="Bills"),
+        expense(4.0, datetime(2026, 3, 2), category="Bills"),
+        expense(1.0, datetime(2026, 3, 3), user_id="u2"),
+    ]
+    assert rollup_deltas(removed, added) == {
+        ("u1", "2026-03", "Food"): [-3.0, -1],
+        ("u1", "2026-03", "Bills"): [3.0, 1],
+        ("u2", "2026-03", "Food"): [1.0, 1],
+    }
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # mongomock has no $type expression; every expense here has a native date.
+    monkeypatch.setattr(rollups, "_month_expr", lambda: {"$dateToString": {"format": "%Y-%m", "date": "$date"}})
+    return AsyncMongoMockClient()["rollups_test"]
+
+
+def test_repair_keeps_a_write_that_lands_during_the_repair(db, monkeypatch):
+    async def run():
+        await db.monthly_rollups.create_index([("user_id", 1), ("month", 1), ("category", 1)], unique=True)
+        first = {**expense(10.0, datetime(2026, 1, 2)), "expense_id": "a"}
+        late = {**expense(5.0, datetime(2026, 1, 3)), "expense_id": "b"}
+        await db.expenses.insert_one(dict(first))
+        await db.monthly_rollups.insert_one({"user_id": "u1", "month": "2026-01", "category": "Food", "total": 3.0, "count": 1})
+
+        count_bucket = rollups._bucket_totals
+        raced = []
+
+        async def count_then_write(*args):
+            totals = await count_bucket(*args)
+            if not raced:
+                # The API adds an expense after the recount, before the repair writes.
+                raced.append(1)
+                await db.expenses.insert_one(dict(late))
+                await rollups.apply_expense_change(db, None, late)
+            return totals
+
+        monkeypatch.setattr(rollups, "_bucket_totals", count_then_write)
+        repaired_users = []
+
+        async def on_repair(user_id):
+            repaired_users.append(user_id)
+
+        report = await rollups.sync_rollups(db, repair=True, on_repair=on_repair)
+        bucket = await db.monthly_rollups.find_one({"user_id": "u1"})
+        assert (bucket["total"], bucket["count"]) == (15.0, 2)
+        assert report["buckets_repaired"] == 1
+        assert report["buckets_unrepaired"] == 0
+        assert repaired_users == ["u1"]
+
+    asyncio.run(run())
+
+
+def test_verify_only_reports(db):
+    async def run():
+        await db.expenses.insert_one({**expense(10.0, datetime(2026, 1, 2)), "expense_id": "a"})
+        report = await rollups.sync_rollups(db)
+        assert report["drift_count"] == 1
+        assert report["drift"][0]["expected"] == {"total": 10.0, "count": 1}
+        assert report["drift"][0]["actual"] is None
+        assert await db.monthly_rollups.count_documents({}) == 0
+
+    asyncio.run(run())
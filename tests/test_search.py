@@ -0,0 +1,68 @@
+import asyncio
+import base64
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+import search
+from server import decode_search_cursor, encode_expense_cursor, encode_search_cursor, expense_cursor_filter
+
+
+def test_search_terms_are_distinct_lowercase_words():
+    assert search.search_terms("Coffee & Cake", "coffee with ANN, café") == ["coffee", "cake", "with", "ann", "café"]
+    assert search.search_terms("Rent") == ["rent"]
+    assert len(search.search_terms("x", " ".join(f"w{i}" for i in range(500)))) == search.MAX_TERMS
+
+
+def test_query_words_are_capped():
+    assert search.query_words("Tea, tea and TEA cups") == ["tea", "and", "cups"]
+    assert len(search.query_words(" ".join(f"w{i}" for i in range(50)))) == search.MAX_QUERY_WORDS
+
+
+def test_prefix_filter_matches_every_word_as_a_prefix():
+    async def run():
+        db = AsyncMongoMockClient()["search_test"]
+        await db.expenses.insert_many([
+            {"expense_id": "a", "search_terms": search.search_terms("Coffee beans", "from the market")},
+            {"expense_id": "b", "search_terms": search.search_terms("Coffee", "airport")},
+            {"expense_id": "c", "search_terms": search.search_terms("Decaf coffee")},
+            {"expense_id": "d", "search_terms": search.search_terms("Co-op (a.b+c)")},
+        ])
+
+        async def matching(q):
+            docs = await db.expenses.find(search.prefix_filter(search.query_words(q))).to_list(None)
+            return sorted(doc["expense_id"] for doc in docs)
+
+        assert await matching("cof") == ["a", "b", "c"]
+        assert await matching("COF mark") == ["a"]
+        # Prefixes only: "offee" is inside a word, not at its start.
+        assert await matching("offee") == []
+        assert await matching("co op") == ["d"]
+        assert await matching("b") == ["a", "d"]
+
+    asyncio.run(run())
+
+
+def test_text_pipeline_resumes_after_score_and_id():
+    pipeline = search.text_pipeline({"user_id": "u1"}, "coffee", {"score": 1.5, "id": "exp_b"}, 20, {"_id": 0})
+    assert pipeline[0] == {"$match": {"user_id": "u1", "$text": {"$search": "coffee"}}}
+    assert pipeline[2] == {"$match": {"$or": [
+        {"score": {"$lt": 1.5}},
+        {"score": 1.5, "expense_id": {"$lt": "exp_b"}},
+    ]}}
+    assert [next(iter(stage)) for stage in pipeline[3:]] == ["$sort", "$limit", "$project"]
+    assert len(search.text_pipeline({"user_id": "u1"}, "coffee", None, 20, {"_id": 0})) == 5
+
+
+def test_search_cursor_round_trips():
+    text = decode_search_cursor(encode_search_cursor(search.TEXT, {"score": 1.5, "expense_id": "exp_a"}))
+    assert (text["mode"], text["score"], text["id"]) == (search.TEXT, 1.5, "exp_a")
+
+    expense = {"date": "2025-11-02T00:00:00", "expense_id": "exp_a"}
+    prefix = decode_search_cursor(encode_search_cursor(search.PREFIX, expense))
+    assert prefix["mode"] == search.PREFIX
+    assert expense_cursor_filter(prefix["after"]) == expense_cursor_filter(encode_expense_cursor(expense))
+
+    with pytest.raises(HTTPException):
+        decode_search_cursor(base64.urlsafe_b64encode(b'{"mode": "fuzzy"}').decode())
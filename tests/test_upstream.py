@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+import pytest
+
+from upstream import UpstreamClient
+
+
+def make_client(statuses: list, **kwargs) -> tuple:
+    """A client whose transport answers with ``statuses`` in turn; an exception instance is raised."""
+    calls = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if isinstance(status, Exception):
+            raise status
+        return httpx.Response(status, json={"attempt": len(calls)})
+
+    client = UpstreamClient("test", **{"max_retries": 2, "backoff": 0, **kwargs})
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+    return client, calls
+
+
+def request(client: UpstreamClient) -> httpx.Response:
+    async def run():
+        try:
+            return await client.get("https://upstream.test/rates")
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+def test_5xx_then_success_is_retried():
+    client, calls = make_client([503, 502, 200])
+    response = request(client)
+    assert response.status_code == 200
+    assert response.json() == {"attempt": 3}
+    assert (client.requests, client.retries, client.failures) == (3, 2, 0)
+
+
+def test_transport_error_then_success_is_retried():
+    client, calls = make_client([httpx.ConnectError("refused"), 200])
+    assert request(client).status_code == 200
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("status", [400, 404, 429, 500])
+def test_other_statuses_are_not_retried(status):
+    client, calls = make_client([status, 200])
+    assert request(client).status_code == status
+    assert len(calls) == 1
+    assert client.retries == 0
+    assert client.failures == (1 if status >= 500 else 0)
+
+
+def test_gives_up_after_max_attempts():
+    client, calls = make_client([504], max_retries=3)
+    response = request(client)
+    assert response.status_code == 504
+    assert len(calls) == 4
+    assert (client.retries, client.failures) == (3, 1)
+
+
+def test_transport_error_is_raised_after_max_attempts():
+    client, calls = make_client([httpx.ReadTimeout("slow")], max_retries=1)
+    with pytest.raises(httpx.ReadTimeout):
+        request(client)
+    assert len(calls) == 2
+    assert client.failures == 1
+    assert client.stats()["latency_ms"]["max"] is not None